@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-# pylint: disable=R0801,W0122,E0602
+# pylint: disable=R0801,W0122,E0602,C0413
 
 # Copyright (c) 2014-2015, Human Brain Project
 #                          Cyrille Favreau <cyrille.favreau@epfl.ch>
@@ -23,6 +23,13 @@
 
 """app.py"""
 import os
+import http_image_streaming_service.service.server as server
+
+# The gevent server requires the standard library to be patched before the
+# service is imported
+server.patch()
+
 import http_image_streaming_service.service.http_image_streaming_service as hiss
 
-hiss.application.run(host=os.environ['HOSTNAME'], port=8080, debug=False, threaded=True)
+hiss.supervisor.start()
+server.run(hiss.application, host=os.environ['HOSTNAME'], port=8080)
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+Streaming benchmark. Starts a fake rendering resource and the service, attaches
+simulated MJPEG viewers to a session and reports the frame rate and latency
+achieved by the viewers, and the CPU and memory used by the service per viewer.
+
+Usage: python benchmarks/streaming_benchmark.py --viewers 50 --duration 30
+
+The service is started from app.py with the environment of the benchmark, so
+that serving modes can be compared, for example with --server gevent or
+HISS_FRAME_BUS=shm. An already running service can be benchmarked with
+--service-url, in which case its CPU and memory are not reported
+"""
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse
+
+BASEDIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASEDIR)
+
+# pylint: disable=C0413
+import http_image_streaming_service.service.settings as settings
+
+SESSION_ID = 'benchmark'
+SERVICE_PORT = 8080
+
+# Markers of the synthetic frames. The frames contain no line break, so that
+# viewers can split the stream into frames with readline
+_JPEG_START = b'\xff\xd8'
+_JPEG_END = b'\xff\xd9'
+
+
+class FakeRenderer(object):
+    """
+    Constructor. Rendering resource serving synthetic frames on /v1/image-jpeg.
+    Each frame carries the time at which it was rendered, so that viewers can
+    measure the end-to-end latency
+    :param frame_size: Number of bytes of the frames
+    :param render_latency: Number of seconds taken to answer a request
+    :param change_rate: Number of new frames rendered per second
+    """
+    def __init__(self, frame_size, render_latency, change_rate):
+        self.frame_size = frame_size
+        self.render_latency = render_latency
+        self.change_rate = change_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._frame = None
+        self._rendered = 0
+        self.server = _RendererServer(('127.0.0.1', 0), _RendererHandler)
+        self.server.renderer = self
+        self.uri = 'http://127.0.0.1:' + str(self.server.server_port)
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def current_frame(self):
+        """
+        Returns the (sequence, frame) of the frame currently rendered
+        """
+        with self._lock:
+            self.requests += 1
+            now = time.time()
+            if self._frame is None or now - self._rendered >= 1.0 / self.change_rate:
+                self._sequence += 1
+                self._rendered = now
+                header = _JPEG_START + ('HISS %d %.6f ' % (self._sequence, now)).encode()
+                padding = max(0, self.frame_size - len(header) - len(_JPEG_END))
+                self._frame = header + b'x' * padding + _JPEG_END
+            return self._sequence, self._frame
+
+    def stop(self):
+        """
+        Stops serving requests
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _RendererHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the fake rendering resource
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """
+        Serves the current frame, as binary or JSON according to the Accept header,
+        or a 304 if the client already has it
+        """
+        renderer = self.server.renderer
+        if not self.path.startswith(settings.HISS_IMAGE_JPEG):
+            self.send_error(404)
+            return
+        time.sleep(renderer.render_latency)
+        sequence, frame = renderer.current_frame()
+        etag = '"' + str(sequence) + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if 'image/jpeg' in self.headers.get('Accept', ''):
+            content_type, body = 'image/jpeg', frame
+        else:
+            content_type = 'application/json'
+            body = json.dumps({'data': base64.b64encode(frame).decode()}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _RendererServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server of the fake rendering resource
+    """
+    daemon_threads = True
+
+
+class Viewer(threading.Thread):
+    """
+    Constructor. Simulated viewer reading the MJPEG stream of a session
+    :param service_url: Base URL of the service API
+    :param session_id: Id of the session to view
+    :param duration: Number of seconds during which the stream is read
+    """
+    def __init__(self, service_url, session_id, duration):
+        threading.Thread.__init__(self, name='viewer')
+        self.daemon = True
+        self._url = urlparse(service_url)
+        self._session_id = session_id
+        self._duration = duration
+        self.frames = 0
+        self.latencies = list()
+        self.error = None
+
+    def _connect(self):
+        """
+        Sends the stream request and skips the response headers. HTTP/1.0 is used
+        so that the response is never chunked
+        :return: The file from which the stream is read
+        """
+        sock = socket.create_connection((self._url.hostname, self._url.port or 80))
+        path = self._url.path + '/image_streaming_feed/' + self._session_id
+        sock.sendall(('GET ' + path + ' HTTP/1.0\r\n'
+                      'Host: ' + self._url.netloc + '\r\n\r\n').encode())
+        stream = sock.makefile('rb')
+        sock.close()
+        status = stream.readline()
+        if b' 200 ' not in status:
+            raise IOError('Unexpected response: ' + status.decode('latin-1').strip())
+        while stream.readline() not in (b'\r\n', b'\n', b''):
+            pass
+        return stream
+
+    def run(self):
+        try:
+            stream = self._connect()
+        except (IOError, socket.error) as e:
+            self.error = str(e)
+            return
+        deadline = time.time() + self._duration
+        frame = b''
+        try:
+            while time.time() < deadline:
+                line = stream.readline()
+                if not line:
+                    self.error = 'Stream closed by the service'
+                    break
+                frame += line
+                if not frame.endswith(_JPEG_END + b'\r\n'):
+                    continue
+                received = time.time()
+                start = frame.find(_JPEG_START + b'HISS ')
+                if start >= 0:
+                    self.frames += 1
+                    rendered = float(frame[start:start + 64].split(b' ')[2])
+                    self.latencies.append(received - rendered)
+                frame = b''
+        finally:
+            stream.close()
+
+
+def process_usage(pid):
+    """
+    Returns the CPU seconds and resident memory bytes of a process, read from /proc
+    :param pid: Id of the process
+    :return: A (cpu_seconds, rss_bytes) tuple, or None if /proc is not available
+    """
+    try:
+        with open('/proc/' + str(pid) + '/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open('/proc/' + str(pid) + '/statm') as statm_file:
+            pages = int(statm_file.read().split()[1])
+    except IOError:
+        return None
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+    return cpu_seconds, pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def percentile(values, fraction):
+    """
+    Returns the given percentile of a list of values
+    :param values: Sorted list of values
+    :param fraction: Percentile, between 0 and 1
+    """
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def start_service(arguments, db_folder):
+    """
+    Starts the service from app.py and waits until it accepts connections
+    :param arguments: Command line arguments of the benchmark
+    :param db_folder: Folder of the route database of the service
+    :return: The service process
+    """
+    environment = dict(os.environ)
+    environment.update({'HOSTNAME': '127.0.0.1', 'HISS_DB': db_folder,
+                        'PYTHONPATH': BASEDIR})
+    # All the simulated viewers share the same session
+    environment.setdefault('HISS_MAX_VIEWERS_PER_SESSION', '0')
+    if arguments.server:
+        environment['HISS_SERVER'] = arguments.server
+    output = None if arguments.verbose else open(os.devnull, 'w')
+    process = subprocess.Popen([sys.executable, os.path.join(BASEDIR, 'app.py')],
+                               env=environment, stdout=output, stderr=output)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('The service exited with code ' + str(process.returncode))
+        try:
+            socket.create_connection(('127.0.0.1', SERVICE_PORT), timeout=1).close()
+            return process
+        except socket.error:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError('The service did not start')
+
+
+def create_route(service_url, session_id, uri, fps):
+    """
+    Routes the session to the fake rendering resource
+    :param service_url: Base URL of the service API
+    :param session_id: Id of the session
+    :param uri: URI of the rendering resource
+    :param fps: Frame rate of the session
+    """
+    url = urlparse(service_url)
+    connection = socket.create_connection((url.hostname, url.port or 80))
+    try:
+        body = json.dumps({'uri': uri, 'fps': fps}).encode()
+        connection.sendall(('POST ' + url.path + '/route HTTP/1.0\r\n'
+                            'Host: ' + url.netloc + '\r\n'
+                            'Cookie: ' + settings.HBP_COOKIE + '=' + session_id + '\r\n'
+                            'Content-Type: application/json\r\n'
+                            'Content-Length: ' + str(len(body)) + '\r\n\r\n').encode() +
+                           body)
+        status = connection.makefile('rb').readline()
+    finally:
+        connection.close()
+    if b' 201 ' not in status:
+        raise RuntimeError('Failed to create route: ' + status.decode('latin-1').strip())
+
+
+def report(arguments, renderer, viewers, duration, usage_before, usage_after):
+    """
+    Prints the results of the benchmark
+    :param arguments: Command line arguments of the benchmark
+    :param renderer: Fake rendering resource
+    :param viewers: Simulated viewers
+    :param duration: Number of seconds during which the viewers were attached
+    :param usage_before: Usage of the service before the viewers were attached
+    :param usage_after: Usage of the service when the viewers were detached
+    """
+    errors = [viewer.error for viewer in viewers if viewer.error]
+    frames = sum(viewer.frames for viewer in viewers)
+    latencies = sorted(latency for viewer in viewers for latency in viewer.latencies)
+    print('Viewers:              %d (%d failed)' % (len(viewers), len(errors)))
+    print('Frame size:           %d bytes' % arguments.frame_size)
+    print('Target fps:           %.1f' % arguments.fps)
+    print('Renderer requests:    %.1f/s' % (renderer.requests / duration))
+    print('Achieved fps:         %.1f per viewer' %
+          (frames / duration / max(1, len(viewers))))
+    print('Latency p50/p90/p99:  %.1f / %.1f / %.1f ms' %
+          tuple(1000 * percentile(latencies, fraction) for fraction in (0.5, 0.9, 0.99)))
+    if usage_before is not None and usage_after is not None:
+        cpu = (usage_after[0] - usage_before[0]) / duration
+        rss = usage_after[1] - usage_before[1]
+        print('Service CPU:          %.1f%% (%.2f%% per viewer)' %
+              (100 * cpu, 100 * cpu / len(viewers)))
+        print('Service RSS:          %.1f MB (%.1f kB per viewer)' %
+              (usage_after[1] / 1048576.0, rss / 1024.0 / len(viewers)))
+    for error in sorted(set(errors)):
+        print('Error: ' + error)
+
+
+def main():
+    """
+    Runs the benchmark
+    """
+    parser = argparse.ArgumentParser(description='Streaming benchmark')
+    parser.add_argument('--viewers', type=int, default=10,
+                        help='Number of simulated viewers')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Number of seconds during which the viewers are attached')
+    parser.add_argument('--fps', type=float, default=settings.HISS_FRAMES_PER_SECOND,
+                        help='Frame rate of the session')
+    parser.add_argument('--frame-size', type=int, default=100000,
+                        help='Number of bytes of the frames')
+    parser.add_argument('--render-latency', type=float, default=0.01,
+                        help='Number of seconds taken by the renderer to answer')
+    parser.add_argument('--change-rate', type=float, default=30,
+                        help='Number of new frames rendered per second')
+    parser.add_argument('--server', choices=('threaded', 'gevent'),
+                        help='Server of the started service')
+    parser.add_argument('--service-url',
+                        help='Base URL of an already running service')
+    parser.add_argument('--verbose', action='store_true',
+                        help='Shows the output of the started service')
+    arguments = parser.parse_args()
+
+    renderer = FakeRenderer(arguments.frame_size, arguments.render_latency,
+                            arguments.change_rate)
+    process = None
+    db_folder = tempfile.mkdtemp()
+    try:
+        service_url = arguments.service_url
+        if service_url is None:
+            process = start_service(arguments, db_folder)
+            service_url = 'http://127.0.0.1:' + str(SERVICE_PORT) + '/' + \
+                settings.APPLICATION_NAME + '/' + settings.API_VERSION
+        create_route(service_url, SESSION_ID, renderer.uri, arguments.fps)
+
+        usage_before = process and process_usage(process.pid)
+        requests_before = renderer.requests
+        viewers = [Viewer(service_url, SESSION_ID, arguments.duration)
+                   for _ in range(arguments.viewers)]
+        start = time.time()
+        for viewer in viewers:
+            viewer.start()
+        for viewer in viewers:
+            viewer.join(arguments.duration + 10)
+        duration = time.time() - start
+        usage_after = process and process_usage(process.pid)
+        renderer.requests -= requests_before
+
+        report(arguments, renderer, viewers, duration, usage_before, usage_after)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        renderer.stop()
+        shutil.rmtree(db_folder)
+
+
+if __name__ == '__main__':
+    main()
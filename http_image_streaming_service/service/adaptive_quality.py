@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the class in charge of lowering the quality of the frames
+sent to viewers that cannot keep up with the frame rate of their stream
+"""
+
+import custom_logging as log
+from frame_transcoder import FrameTier
+from settings import HISS_ADAPTIVE_QUALITY_LEVELS, HISS_SLOW_VIEWER_FRAMES, \
+    HISS_FAST_VIEWER_FRAMES
+
+
+class AdaptiveQuality(object):
+    """
+    Constructor
+    :param tier: Tier requested by the viewer. It is used as long as the viewer
+                 keeps up with the stream
+    """
+    def __init__(self, tier):
+        self._requested_tier = tier
+        self._tiers = [tier] + [
+            FrameTier(tier.width, tier.height, quality)
+            for quality in HISS_ADAPTIVE_QUALITY_LEVELS
+            if tier.quality is None or quality < tier.quality]
+        self._level = 0
+        self._slow_frames = 0
+        self._fast_frames = 0
+
+    @property
+    def tier(self):
+        """
+        Returns the tier of the next frames to send to the viewer
+        """
+        return self._tiers[self._level]
+
+    def update(self, write_seconds, frame_interval, dropped_frames=0):
+        """
+        Updates the quality according to the time needed to send the last frame.
+        The quality is lowered after HISS_SLOW_VIEWER_FRAMES frames took longer
+        than the frame interval to be sent or were dropped, and raised again
+        after HISS_FAST_VIEWER_FRAMES frames were sent in less than half of it
+        :param write_seconds: Time spent writing the last frame to the viewer
+        :param frame_interval: Time between two frames of the stream, in seconds
+        :param dropped_frames: Number of frames the viewer missed before the last one
+        """
+        if write_seconds > frame_interval or dropped_frames > 0:
+            self._fast_frames = 0
+            self._slow_frames += 1
+            if self._slow_frames >= HISS_SLOW_VIEWER_FRAMES and \
+                    self._level < len(self._tiers) - 1:
+                self._level += 1
+                self._slow_frames = 0
+                log.debug(1, 'Viewer is late, quality lowered to %s', self.tier.quality)
+        elif write_seconds < frame_interval / 2:
+            self._slow_frames = 0
+            self._fast_frames += 1
+            if self._fast_frames >= HISS_FAST_VIEWER_FRAMES and self._level > 0:
+                self._level -= 1
+                self._fast_frames = 0
+                log.debug(1, 'Viewer caught up, quality raised to %s', self.tier.quality)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the class in charge of limiting the number of streams
+opened per session and per client, and of reaping the streams of the clients
+that stopped reading them
+"""
+
+# pylint: disable=W0403
+import threading
+import time
+
+import custom_logging as log
+from settings import HISS_MAX_VIEWERS_PER_SESSION, HISS_MAX_STREAMS_PER_CLIENT, \
+    HISS_STREAM_IDLE_TIMEOUT
+
+
+class StreamTicket(object):
+    """
+    Constructor. Admission of a stream
+    :param session_id: Id of the streamed session
+    :param client: Address of the client
+    """
+    def __init__(self, session_id, client):
+        self.session_id = session_id
+        self.client = client
+        self.last_write = time.time()
+        self.released = False
+        self.on_release = None
+
+    def touch(self):
+        """
+        Records a successful write to the client
+        """
+        self.last_write = time.time()
+
+    def idle(self, seconds):
+        """
+        Returns True if nothing was written to the client for the given number
+        of seconds
+        :param seconds: Number of seconds
+        """
+        return time.time() - self.last_write >= seconds
+
+
+class AdmissionController(object):
+    """
+    Constructor
+    :param max_per_session: Maximum number of streams of a session, 0 for no limit
+    :param max_per_client: Maximum number of streams of a client, 0 for no limit
+    :param idle_timeout: Number of seconds without successful write after which a
+                         stream is reaped, 0 to never reap streams
+    """
+    def __init__(self, max_per_session=HISS_MAX_VIEWERS_PER_SESSION,
+                 max_per_client=HISS_MAX_STREAMS_PER_CLIENT,
+                 idle_timeout=HISS_STREAM_IDLE_TIMEOUT):
+        self._max_per_session = max_per_session
+        self._max_per_client = max_per_client
+        self._idle_timeout = idle_timeout
+        self._tickets = set()
+        self._sessions = dict()
+        self._clients = dict()
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def admit(self, session_id, client):
+        """
+        Admits a new stream, unless the session or the client already has too
+        many streams
+        :param session_id: Id of the session to stream
+        :param client: Address of the client
+        :return: The ticket of the stream, to be released when the stream ends, or
+                 None if the stream is refused
+        """
+        with self._lock:
+            if self._max_per_session and \
+                    self._sessions.get(session_id, 0) >= self._max_per_session:
+                log.error('Refusing stream of session %s: too many viewers', session_id)
+                return None
+            if self._max_per_client and \
+                    self._clients.get(client, 0) >= self._max_per_client:
+                log.error('Refusing stream of session %s: too many streams for %s',
+                          session_id, client)
+                return None
+            ticket = StreamTicket(session_id, client)
+            self._tickets.add(ticket)
+            self._sessions[session_id] = self._sessions.get(session_id, 0) + 1
+            self._clients[client] = self._clients.get(client, 0) + 1
+            if self._idle_timeout and self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name='stream-reaper')
+                self._reaper.daemon = True
+                self._reaper.start()
+            return ticket
+
+    def release(self, ticket):
+        """
+        Releases the ticket of a stream that ended or was reaped. Releasing a
+        ticket more than once has no effect
+        :param ticket: Ticket returned by admit
+        """
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._tickets.discard(ticket)
+            self._decrement(self._sessions, ticket.session_id)
+            self._decrement(self._clients, ticket.client)
+        if ticket.on_release is not None:
+            ticket.on_release()
+
+    def streams(self, session_id):
+        """
+        Returns the number of streams of the given session
+        :param session_id: Id of the session
+        """
+        with self._lock:
+            return self._sessions.get(session_id, 0)
+
+    @staticmethod
+    def _decrement(counts, key):
+        """
+        Decrements a stream count, forgetting it when it reaches 0
+        :param counts: Dictionary of the counts
+        :param key: Key of the count
+        """
+        count = counts.get(key, 0) - 1
+        if count > 0:
+            counts[key] = count
+        else:
+            counts.pop(key, None)
+
+    def reap_idle_streams(self):
+        """
+        Releases the tickets of the streams to which nothing was successfully
+        written for idle_timeout seconds
+        """
+        with self._lock:
+            idle = [ticket for ticket in self._tickets if ticket.idle(self._idle_timeout)]
+        for ticket in idle:
+            log.info(1, 'Reaping idle stream of session %s for %s',
+                     ticket.session_id, ticket.client)
+            self.release(ticket)
+
+    def _reap(self):
+        """
+        Reaps the idle streams periodically
+        """
+        while True:
+            time.sleep(self._idle_timeout / 4.0)
+            try:
+                self.reap_idle_streams()
+            except Exception as e:  # pylint: disable=W0703
+                log.error('Failed to reap idle streams: %s', e)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the circuit breakers protecting the rendering resources.
+After repeated failures, a circuit opens and no request is sent to the rendering
+resource until a backoff delay, growing exponentially with random jitter, has
+elapsed. A single probe request is then allowed: the circuit closes if it
+succeeds, and opens again with a longer delay if it fails
+"""
+
+# pylint: disable=W0403
+import random
+import threading
+import time
+
+from settings import HISS_CIRCUIT_FAILURE_THRESHOLD, HISS_CIRCUIT_BACKOFF, \
+    HISS_CIRCUIT_MAX_BACKOFF, HISS_UPSTREAM_IDLE_TIMEOUT
+
+# States of a circuit
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Circuit breakers shared by all the grabbers targeting the same URI, with the
+# time they were last used
+_breakers = dict()
+_breakers_lock = threading.Lock()
+_next_expiry = [0]
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a request is not sent because the circuit of the rendering
+    resource is open
+    """
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Constructor
+    :param failure_threshold: Number of consecutive failures opening the circuit
+    :param backoff: Number of seconds the circuit stays open after it opened for
+                    the first time
+    :param max_backoff: Maximum number of seconds the circuit stays open
+    """
+    def __init__(self, failure_threshold=HISS_CIRCUIT_FAILURE_THRESHOLD,
+                 backoff=HISS_CIRCUIT_BACKOFF, max_backoff=HISS_CIRCUIT_MAX_BACKOFF):
+        self._failure_threshold = failure_threshold
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._state = CLOSED
+        self._failures = 0
+        self._openings = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        Returns the state of the circuit
+        """
+        return self._state
+
+    def allow(self):
+        """
+        Returns True if a request may be sent. When the backoff delay of an open
+        circuit has elapsed, a single caller is allowed to probe the rendering
+        resource, and must record the outcome of its request
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.time() >= self._retry_at:
+                self._state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """
+        Records a successful request, closing the circuit
+        """
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._openings = 0
+
+    def record_failure(self):
+        """
+        Records a failed request
+        :return: True if the failure opened the circuit
+        """
+        with self._lock:
+            self._failures += 1
+            if self._state != HALF_OPEN and self._failures < self._failure_threshold:
+                return False
+            backoff = min(self._max_backoff, self._backoff * 2 ** self._openings)
+            # Jitter spreads the probes of the services sharing a rendering resource
+            self._retry_at = time.time() + random.uniform(backoff / 2.0, backoff)
+            self._openings += 1
+            self._state = OPEN
+            return True
+
+
+def get_circuit_breaker(uri):
+    """
+    Returns the circuit breaker of the given URI. The circuit breaker is created
+    on first use, and discarded once it was not used for HISS_UPSTREAM_IDLE_TIMEOUT
+    seconds. Callers should therefore get it again for each request
+    :param uri: URI of the rendering resource
+    """
+    now = time.time()
+    with _breakers_lock:
+        if now >= _next_expiry[0]:
+            _expire_breakers(now)
+        entry = _breakers.get(uri)
+        if entry is None:
+            entry = [CircuitBreaker(), now]
+            _breakers[uri] = entry
+        entry[1] = now
+        return entry[0]
+
+
+def _expire_breakers(now):
+    """
+    Discards the circuit breakers that were not used recently. Must be called
+    with the lock held
+    :param now: Current time
+    """
+    for uri, (_, used_at) in list(_breakers.items()):
+        if now - used_at >= HISS_UPSTREAM_IDLE_TIMEOUT:
+            del _breakers[uri]
+    _next_expiry[0] = now + HISS_UPSTREAM_IDLE_TIMEOUT
@@ -22,53 +22,85 @@
 # All rights reserved. Do not distribute without further notice.
 
 """
-This module provides helper functions for logging of info, debug and error information
+This module provides helper functions for logging of info, debug and error information.
+Messages are formatted lazily: the optional arguments are merged into the message
+by the logging module, and only if the record is actually emitted
 """
 
-from threading import current_thread
-
-import datetime
+import json
 import logging
 
+import settings
+
+# Format of the timestamps
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON document per line
+    """
+    def format(self, record):
+        document = {
+            'timestamp': self.formatTime(record, DATE_FORMAT),
+            'level': record.levelname,
+            'verbosity': getattr(record, 'verbosity', None),
+            'thread': record.threadName,
+            'message': record.getMessage()}
+        if record.exc_info:
+            document['exception'] = self.formatException(record.exc_info)
+        return json.dumps(document)
+
+
+def _create_handler():
+    """
+    Returns the handler writing the records in the format selected by the settings
+    """
+    handler = logging.StreamHandler()
+    if settings.HISS_LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(
+            '%(levelname)s [%(asctime)s] [%(threadName)s] %(message)s', DATE_FORMAT))
+    return handler
+
+
 L = logging.getLogger(__name__)
 logging.basicConfig(level=logging.ERROR)
+L.setLevel(settings.HISS_LOG_LEVEL)
+L.addHandler(_create_handler())
+L.propagate = False
 
 
-def info(level, message):
+def info(level, message, *args):
     """
     This function logs a message in the system console with the following format:
-    [message level][timestamp][thread name][message]
-    :param level: Message level. Only message with a level higher than LOGGING_LEVEL are processed
-    :param message: Message to be logged
+    INFO [timestamp] [thread name] message
+    :param level: Verbosity of the message, reported in JSON records
+    :param message: Message to be logged, possibly containing %-style placeholders
+    :param args: Values of the placeholders
     """
-    L.info("[%s] [%s] [%s] %s",
-           str(level),
-           datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-           current_thread().getName(),
-           message)
+    if L.isEnabledFor(logging.INFO):
+        L.info(message, *args, extra={'verbosity': level})
 
 
-def debug(level, message):
+def debug(level, message, *args):
     """
     This function logs a message in the system console with the following format:
-    [message level][timestamp][thread name][message]
-    :param level: Message level. Only message with a level higher than LOGGING_LEVEL are processed
-    :param message: Message to be logged
+    DEBUG [timestamp] [thread name] message
+    :param level: Verbosity of the message, reported in JSON records
+    :param message: Message to be logged, possibly containing %-style placeholders
+    :param args: Values of the placeholders
     """
-    L.debug("[%s] [%s] [%s] %s",
-            str(level),
-            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            current_thread().getName(),
-            message)
+    if L.isEnabledFor(logging.DEBUG):
+        L.debug(message, *args, extra={'verbosity': level})
 
 
-def error(message):
+def error(message, *args):
     """
     This function logs a message in the system console with the following format:
-    ERROR [timestamp][thread name][message]
-    :param message: Message to be logged
+    ERROR [timestamp] [thread name] message
+    :param message: Message to be logged, possibly containing %-style placeholders
+    :param args: Values of the placeholders
     """
-    L.error("[%s] [%s] %s",
-            datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            current_thread().getName(),
-            message)
+    L.error(message, *args)
@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the classes in charge of sharing a single upstream frame
+grabber between all the viewers of a session
+"""
+
+# pylint: disable=W0403
+import threading
+import time
+import requests
+
+import custom_logging as log
+import metrics
+import frame_transcoder
+from circuit_breaker import CircuitOpenError
+from frame_clock import FrameClock
+from settings import HISS_PUSH_TIMEOUT, HISS_SUBSCRIBER_TIMEOUT
+
+
+class _TierSlot(object):
+    """
+    Latest frame transcoded for a given tier
+    """
+    def __init__(self):
+        self.sequence = 0
+        self.frame = None
+        self.lock = threading.Lock()
+
+
+class FrameBroadcaster(object):
+    """
+    Constructor
+    :param session_id: Id of the session to broadcast
+    :param frame_grabber: Implementation of the class in charge of fetching the images
+    :param route_manager: Route manager used to check that the session is still routed
+    :param frame_not_found: Frame broadcast when the rendering resource has no image
+    :param application: Flask application providing the context of the grab loop
+    :param frame_bus: Bus sharing the frames with the other workers, or None
+    """
+    def __init__(self, session_id, frame_grabber, route_manager, frame_not_found, application,
+                 frame_bus=None):
+        self._session_id = session_id
+        self._frame_grabber = frame_grabber
+        self._route_manager = route_manager
+        self._frame_not_found = frame_not_found
+        self._application = application
+        self._frame_bus = frame_bus
+        self._condition = threading.Condition()
+        self._frame = None
+        self._sequence = 0
+        self._subscribers = 0
+        self._running = False
+        self._thread = None
+        self._tiers = dict()
+        self._tiers_lock = threading.Lock()
+        self._pushed_at = 0
+        self._bus_sequence = 0
+        # Recorder of the broadcast frames, or None
+        self.recorder = None
+
+    @property
+    def session_id(self):
+        """
+        Returns the id of the broadcast session
+        """
+        return self._session_id
+
+    @property
+    def subscribers(self):
+        """
+        Returns the number of viewers currently attached to the broadcaster
+        """
+        return self._subscribers
+
+    @property
+    def running(self):
+        """
+        Returns True if the upstream grab loop is active
+        """
+        return self._running
+
+    @property
+    def latest_frame(self):
+        """
+        Returns the latest frame broadcast, or None
+        """
+        return self._frame
+
+    def add_subscriber(self):
+        """
+        Attaches a new viewer and starts the grab loop if needed
+        """
+        with self._condition:
+            self._subscribers += 1
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(
+                    target=self._grab_loop,
+                    name='broadcaster-' + str(self._session_id))
+                self._thread.daemon = True
+                self._thread.start()
+
+    def remove_subscriber(self):
+        """
+        Detaches a viewer and stops the grab loop when the last one is gone
+        :return: The number of remaining viewers
+        """
+        with self._condition:
+            self._subscribers = max(0, self._subscribers - 1)
+            if self._subscribers == 0:
+                self._stop()
+            return self._subscribers
+
+    def wait_for_frame(self, last_sequence, timeout=HISS_SUBSCRIBER_TIMEOUT,
+                       tier=frame_transcoder.NATIVE_TIER):
+        """
+        Blocks until a frame more recent than the given sequence is available
+        :param last_sequence: Sequence number of the last frame received by the viewer
+        :param timeout: Maximum number of seconds to wait for a new frame
+        :param tier: Size and quality of the frame expected by the viewer
+        :return: A (sequence, frame) tuple. The frame is None if no new frame was
+                 produced before the timeout or if the broadcast stopped
+        """
+        with self._condition:
+            if self._running and self._sequence <= last_sequence:
+                self._condition.wait(timeout)
+            if self._sequence <= last_sequence:
+                return last_sequence, None
+            sequence, frame = self._sequence, self._frame
+        if tier.is_native:
+            return sequence, frame
+        return self._transcode(sequence, frame, tier)
+
+    def _transcode(self, sequence, frame, tier):
+        """
+        Returns the given frame transcoded for the given tier. Each frame is
+        transcoded once per tier, whatever the number of viewers of that tier
+        :param sequence: Sequence number of the frame
+        :param frame: Native frame
+        :param tier: Size and quality of the expected frame
+        :return: A (sequence, frame) tuple. The frame may be more recent than the
+                 given one if another viewer already transcoded a newer frame
+        """
+        with self._tiers_lock:
+            slot = self._tiers.get(tier)
+            if slot is None:
+                slot = _TierSlot()
+                self._tiers[tier] = slot
+        with slot.lock:
+            if slot.sequence < sequence:
+                try:
+                    slot.frame = frame_transcoder.transcode(frame, tier)
+                except IOError as e:
+                    log.error('Failed to transcode frame of session %s: %s',
+                              self._session_id, e)
+                    slot.frame = frame
+                slot.sequence = sequence
+            return slot.sequence, slot.frame
+
+    def publish(self, frame):
+        """
+        Stores the given frame in the shared slot and wakes up the viewers. The
+        frame is also recorded if the session is being recorded
+        :param frame: Frame to broadcast
+        """
+        with self._condition:
+            self._frame = frame
+            self._sequence += 1
+            self._condition.notify_all()
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(frame)
+
+    def push(self, frame, pushed_at=None):
+        """
+        Broadcasts a frame pushed by the rendering resource. The session is not
+        polled for as long as frames keep being pushed
+        :param frame: Frame pushed by the rendering resource
+        :param pushed_at: Time at which the frame was pushed, now by default
+        """
+        self._pushed_at = pushed_at or time.time()
+        if self._frame_bus is not None:
+            # The frame is also delivered to the viewers of the other workers,
+            # whose grab loops stop polling while the session is pushed
+            sequence = self._frame_bus.push(self._session_id, frame)
+            if sequence is not None:
+                self._bus_sequence = sequence
+        self.publish(frame)
+
+    def _pushed_recently(self):
+        """
+        Returns True if the rendering resource pushed a frame recently, to this
+        worker or to another one
+        """
+        pushed_at = self._pushed_at
+        if self._frame_bus is not None:
+            pushed_at = max(pushed_at, self._frame_bus.pushed_at(self._session_id))
+        return time.time() - pushed_at < HISS_PUSH_TIMEOUT
+
+    def _follow_bus(self):
+        """
+        Publishes the latest frame of the frame bus, if it was not published yet
+        """
+        if self._frame_bus is None:
+            return
+        sequence, frame = self._frame_bus.latest(self._session_id, self._bus_sequence)
+        if frame is not None:
+            self._bus_sequence = sequence
+            self.publish(frame)
+
+    def _stop(self):
+        """
+        Stops the grab loop and wakes up the viewers. Must be called with the
+        condition held
+        """
+        self._running = False
+        self._condition.notify_all()
+
+    def _grab_loop(self):
+        """
+        Fetches frames from the rendering resource for as long as there are viewers
+        """
+        session_id = self._session_id
+        log.info(1, 'Starting broadcast for session %s', session_id)
+        try:
+            with self._application.app_context():
+                self._grab_frames()
+        finally:
+            with self._condition:
+                self._stop()
+            if self._frame_bus is not None:
+                self._frame_bus.release(session_id)
+            log.info(1, 'Broadcast stopped for session %s', session_id)
+
+    def _grab_frames(self):
+        """
+        Grab loop body, executed within the application context. When the frames
+        are shared with other workers, only the worker owning the session fetches
+        them from the rendering resource, the others follow the frame bus
+        """
+        session_id = self._session_id
+        clock = FrameClock(self._route_manager.get_route_fps(session_id))
+        fetch_seconds = metrics.UPSTREAM_FETCH_SECONDS.labels(session_id)
+        while self._running:
+            if not self._route_manager.has_route(session_id):
+                log.info(1, 'No route for session %s', session_id)
+                break
+            clock.fps = self._route_manager.get_route_fps(session_id)
+            if clock.wait() > 0:
+                log.debug(1, 'Session %s is late, %d frame(s) skipped so far',
+                          session_id, clock.skipped)
+            if self._pushed_recently():
+                # The rendering resource pushes its frames, possibly to another
+                # worker, which shares them on the frame bus
+                self._follow_bus()
+                continue
+            owner = self._frame_bus is None or self._frame_bus.acquire(session_id)
+            if not owner:
+                self._follow_bus()
+                continue
+            try:
+                start = time.time()
+                frame = self._frame_grabber.get_frame()
+                fetch_seconds.observe(time.time() - start)
+                if frame is not None:
+                    self._broadcast(frame)
+            except (KeyError, CircuitOpenError):
+                # Returns an empty frame, also while the rendering resource is
+                # given time to recover
+                self._broadcast(self._frame_not_found)
+            except ValueError as e:
+                log.error('%s', e)
+            except (requests.exceptions.RequestException, IOError) as e:
+                # The failure is counted by the circuit breaker of the rendering
+                # resource. Routes of dead rendering resources are removed by the
+                # route supervisor, not on the first lost connection
+                log.error('Lost connection with rendering resource of session %s: %s',
+                          session_id, e)
+                self._broadcast(self._frame_not_found)
+
+    def _broadcast(self, frame):
+        """
+        Publishes a frame fetched by this worker to the local viewers and to the
+        other workers
+        :param frame: Frame to broadcast
+        """
+        self.publish(frame)
+        if self._frame_bus is not None:
+            self._frame_bus.publish(self._session_id, frame)
+
+
+class BroadcasterRegistry(object):
+    """
+    Constructor
+    :param route_manager: Route manager used to check that sessions are still routed
+    :param frame_not_found: Frame broadcast when a rendering resource has no image
+    :param application: Flask application providing the context of the grab loops
+    :param frame_bus: Bus sharing the frames with the other workers, or None
+    """
+    def __init__(self, route_manager, frame_not_found, application, frame_bus=None):
+        self._route_manager = route_manager
+        self._frame_not_found = frame_not_found
+        self._application = application
+        self._frame_bus = frame_bus
+        self._broadcasters = dict()
+        self._pushed = dict()
+        self._pushes_expire_at = 0
+        self._recorders = dict()
+        self._lock = threading.Lock()
+
+    def subscribe(self, session_id, frame_grabber):
+        """
+        Attaches a viewer to the broadcaster of the given session, creating it
+        if it does not exist yet
+        :param session_id: Id of the session to stream
+        :param frame_grabber: Frame grabber used if a new broadcaster has to be created
+        :return: The broadcaster of the session
+        """
+        with self._lock:
+            broadcaster = self._broadcasters.get(session_id)
+            if broadcaster is None or not broadcaster.running:
+                broadcaster = FrameBroadcaster(
+                    session_id, frame_grabber, self._route_manager,
+                    self._frame_not_found, self._application, self._frame_bus)
+                broadcaster.recorder = self._recorders.get(session_id)
+                self._broadcasters[session_id] = broadcaster
+                self._expire_pushes()
+                pushed_at, frame = self._pushed.get(session_id, (0, None))
+                if frame is not None and time.time() - pushed_at < HISS_PUSH_TIMEOUT:
+                    # Viewers of a pushed session start with the latest pushed frame,
+                    # and the session is not polled
+                    broadcaster.push(frame, pushed_at)
+            broadcaster.add_subscriber()
+            metrics.ACTIVE_VIEWERS.labels(session_id).set(broadcaster.subscribers)
+            log.info(1, 'Session %s has %d viewer(s)', session_id, broadcaster.subscribers)
+            return broadcaster
+
+    def unsubscribe(self, broadcaster):
+        """
+        Detaches a viewer from its broadcaster. The broadcaster is discarded when
+        its last viewer is gone
+        :param broadcaster: Broadcaster returned by subscribe
+        """
+        with self._lock:
+            session_id = broadcaster.session_id
+            subscribers = broadcaster.remove_subscriber()
+            if self._broadcasters.get(session_id) is not broadcaster:
+                return
+            if subscribers == 0:
+                del self._broadcasters[session_id]
+                metrics.remove_session(session_id)
+            else:
+                metrics.ACTIVE_VIEWERS.labels(session_id).set(subscribers)
+
+    def push(self, session_id, frame):
+        """
+        Broadcasts a frame pushed by the rendering resource of the given session.
+        The latest pushed frame is kept for the viewers that join later
+        :param session_id: Id of the session
+        :param frame: Frame pushed by the rendering resource
+        """
+        with self._lock:
+            self._expire_pushes()
+            self._pushed[session_id] = (time.time(), frame)
+            broadcaster = self._broadcasters.get(session_id)
+            recorder = self._recorders.get(session_id)
+        metrics.FRAMES_PUSHED.labels(session_id).inc()
+        if broadcaster is not None and broadcaster.running:
+            broadcaster.push(frame)
+            return
+        if self._frame_bus is not None:
+            # The viewers of the session may be served by other workers
+            self._frame_bus.push(session_id, frame)
+        if recorder is not None:
+            # Pushed frames are recorded even if the session has no viewers
+            recorder.record(frame)
+
+    def start_recording(self, session_id, recorder):
+        """
+        Records the frames broadcast to the viewers of the given session, or pushed
+        by its rendering resource
+        :param session_id: Id of the session
+        :param recorder: Recorder of the frames of the session
+        :return: False if the session is already being recorded
+        """
+        with self._lock:
+            if session_id in self._recorders:
+                return False
+            self._recorders[session_id] = recorder
+            broadcaster = self._broadcasters.get(session_id)
+            if broadcaster is not None:
+                broadcaster.recorder = recorder
+        log.info(1, 'Recording session %s', session_id)
+        return True
+
+    def stop_recording(self, session_id):
+        """
+        Stops recording the given session and closes its recorder
+        :param session_id: Id of the session
+        :return: False if the session was not being recorded
+        """
+        with self._lock:
+            recorder = self._recorders.pop(session_id, None)
+            broadcaster = self._broadcasters.get(session_id)
+            if broadcaster is not None:
+                broadcaster.recorder = None
+        if recorder is None:
+            return False
+        recorder.close()
+        log.info(1, 'Recording of session %s stopped', session_id)
+        return True
+
+    def latest_frame(self, session_id):
+        """
+        Returns the latest frame broadcast to the viewers of the given session, or
+        pushed by its rendering resource
+        :param session_id: Id of the session
+        :return: The frame, or None if the session is neither viewed nor pushed
+        """
+        with self._lock:
+            self._expire_pushes()
+            broadcaster = self._broadcasters.get(session_id)
+            pushed_at, frame = self._pushed.get(session_id, (0, None))
+        if broadcaster is not None and broadcaster.running and \
+                broadcaster.latest_frame is not None:
+            return broadcaster.latest_frame
+        if time.time() - pushed_at < HISS_PUSH_TIMEOUT:
+            return frame
+        return None
+
+    def remove_session(self, session_id):
+        """
+        Forgets the latest frame pushed by the rendering resource of the given
+        session, once its route is removed
+        :param session_id: Id of the session
+        """
+        with self._lock:
+            self._pushed.pop(session_id, None)
+
+    def _expire_pushes(self):
+        """
+        Forgets the frames of the sessions that stopped pushing. The sessions are
+        checked at most once per HISS_PUSH_TIMEOUT. Must be called with the lock held
+        """
+        now = time.time()
+        if now < self._pushes_expire_at:
+            return
+        for session_id, (pushed_at, _) in list(self._pushed.items()):
+            if now - pushed_at >= HISS_PUSH_TIMEOUT:
+                del self._pushed[session_id]
+        self._pushes_expire_at = now + HISS_PUSH_TIMEOUT
+
+    def get(self, session_id):
+        """
+        Returns the broadcaster of the given session, or None
+        :param session_id: Id of the session
+        """
+        with self._lock:
+            return self._broadcasters.get(session_id)
+
+    def viewers(self):
+        """
+        Returns a dictionary of the number of viewers per session
+        """
+        with self._lock:
+            return dict((session_id, broadcaster.subscribers)
+                        for session_id, broadcaster in self._broadcasters.items())
@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the transports in charge of sharing the frames of a session
+between the worker processes of the service. For each session, a single worker
+owns the upstream frame grabber and publishes the frames on the bus. The other
+workers serving viewers of the same session follow the bus instead of polling
+the rendering resource.
+
+A transport implements the FrameBus interface. Transports are selected with the
+HISS_FRAME_BUS setting, either by name ('local', 'shm') or by the dotted path of
+a FrameBus class, so that multi-node transports can be plugged in
+"""
+
+# pylint: disable=W0403
+import errno
+import fcntl
+import hashlib
+import importlib
+import os
+import threading
+import time
+
+import custom_logging as log
+import settings
+from frame_ring_buffer import FrameRingBuffer
+
+
+class FrameBus(object):
+    """
+    Interface of the frame bus transports
+    """
+    def acquire(self, session_id):
+        """
+        Tries to become the owner of the given session. Ownership is kept until
+        released, or until the owning process dies. Must not block
+        :param session_id: Id of the session
+        :return: True if the caller owns the session
+        """
+        raise NotImplementedError
+
+    def release(self, session_id):
+        """
+        Gives up the ownership of the given session, if owned
+        :param session_id: Id of the session
+        """
+        raise NotImplementedError
+
+    def publish(self, session_id, frame):
+        """
+        Publishes a new frame of the given session. Only called by the owner
+        :param session_id: Id of the session
+        :param frame: JPEG image
+        """
+        raise NotImplementedError
+
+    def push(self, session_id, frame):
+        """
+        Publishes a frame pushed by the rendering resource of the given session.
+        Unlike publish, may be called by any worker. The frame is only published
+        if the session has an owner, since no worker follows the bus otherwise
+        :param session_id: Id of the session
+        :param frame: JPEG image
+        :return: The sequence number of the frame, or None if it was not published
+        """
+        raise NotImplementedError
+
+    def pushed_at(self, session_id):
+        """
+        Returns the time at which the latest frame of the given session was pushed,
+        whatever the worker that received it
+        :param session_id: Id of the session
+        :return: The time, in seconds since the epoch, or 0
+        """
+        raise NotImplementedError
+
+    def latest(self, session_id, last_sequence):
+        """
+        Returns the latest frame published for the given session, if it was not
+        already returned
+        :param session_id: Id of the session
+        :param last_sequence: Sequence number of the last frame received
+        :return: A (sequence, frame) tuple. The frame is None if no frame more
+                 recent than the given sequence was published
+        """
+        raise NotImplementedError
+
+
+class _LocalHub(object):
+    """
+    State shared by the local frame buses standing for different workers
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owners = dict()
+        self.frames = dict()
+        self.pushed = dict()
+
+
+class LocalFrameBus(FrameBus):
+    """
+    Constructor. In-process transport, standing for the other transports in tests
+    and single-process deployments
+    :param hub: State shared with the buses of the other simulated workers
+    """
+    def __init__(self, hub=None):
+        self._hub = hub or _LocalHub()
+
+    @property
+    def hub(self):
+        """
+        Returns the state shared with the buses of the other simulated workers
+        """
+        return self._hub
+
+    def acquire(self, session_id):
+        with self._hub.lock:
+            owner = self._hub.owners.setdefault(session_id, self)
+            return owner is self
+
+    def release(self, session_id):
+        with self._hub.lock:
+            if self._hub.owners.get(session_id) is self:
+                del self._hub.owners[session_id]
+
+    def publish(self, session_id, frame):
+        with self._hub.lock:
+            self._publish(session_id, frame)
+
+    def _publish(self, session_id, frame):
+        """
+        Publishes a frame. Must be called with the lock of the hub held
+        :param session_id: Id of the session
+        :param frame: JPEG image
+        :return: The sequence number of the frame
+        """
+        sequence = self._hub.frames.get(session_id, (0, None))[0] + 1
+        self._hub.frames[session_id] = (sequence, frame)
+        return sequence
+
+    def push(self, session_id, frame):
+        with self._hub.lock:
+            if session_id not in self._hub.owners:
+                return None
+            self._hub.pushed[session_id] = time.time()
+            return self._publish(session_id, frame)
+
+    def pushed_at(self, session_id):
+        with self._hub.lock:
+            return self._hub.pushed.get(session_id, 0)
+
+    def latest(self, session_id, last_sequence):
+        with self._hub.lock:
+            sequence, frame = self._hub.frames.get(session_id, (0, None))
+        if sequence == last_sequence:
+            return last_sequence, None
+        return sequence, frame
+
+
+class SharedDirectoryFrameBus(FrameBus):
+    """
+    Constructor. Transport between the processes of a node, through files of a
+    shared directory, preferably on a memory file system such as /dev/shm. The
+    frames of a session are written to a memory-mapped ring buffer, so neither
+    the owner nor the followers open or allocate files per frame. The ownership
+    of a session is an exclusive lock on a file of the directory, so it is
+    released by the system if the owner dies
+    :param folder: Shared directory
+    :param ring_size: Number of bytes of the ring buffer of each session
+    """
+    def __init__(self, folder, ring_size=settings.HISS_FRAME_RING_SIZE):
+        self._folder = folder
+        self._ring_size = ring_size
+        self._lock_files = dict()
+        self._rings = dict()
+        self._lock = threading.Lock()
+        try:
+            os.makedirs(folder)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _path(self, session_id, extension):
+        """
+        Returns the path of a file of the given session
+        :param session_id: Id of the session
+        :param extension: Extension of the file
+        """
+        name = hashlib.sha1(str(session_id).encode('utf-8')).hexdigest()
+        return os.path.join(self._folder, name + extension)
+
+    def _ring(self, session_id, create=False):
+        """
+        Returns the ring buffer of the given session, mapping it on first use, and
+        again when it was replaced by the ring buffer of a new owner
+        :param session_id: Id of the session
+        :param create: True to create the ring buffer if it does not exist yet
+        :return: The ring buffer, or None if it does not exist
+        """
+        path = self._path(session_id, '.ring')
+        try:
+            inode = os.stat(path).st_ino
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            inode = None
+        with self._lock:
+            ring = self._rings.get(session_id)
+            if ring is not None and ring.inode != inode:
+                # The ring buffer was removed by its last owner
+                del self._rings[session_id]
+                ring.close()
+                ring = None
+            if ring is None:
+                if inode is None and not create:
+                    return None
+                # Sequence numbers of a new ring buffer follow those of the
+                # previous ones, so that followers notice its first frame
+                ring = FrameRingBuffer(path, self._ring_size,
+                                       first_sequence=int(time.time() * 1000000))
+                self._rings[session_id] = ring
+            return ring
+
+    def acquire(self, session_id):
+        with self._lock:
+            if session_id in self._lock_files:
+                return True
+            path = self._path(session_id, '.lock')
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                lock_file.close()
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return False
+                raise
+            if not self._is_current(lock_file, path):
+                # The file was removed by the previous owner before being locked
+                lock_file.close()
+                return False
+            self._lock_files[session_id] = lock_file
+        self._ring(session_id, create=True)
+        log.info(1, 'Owning upstream of session %s', session_id)
+        return True
+
+    @staticmethod
+    def _is_current(lock_file, path):
+        """
+        Returns True if the given open lock file is still the file of the given path
+        :param lock_file: Open lock file
+        :param path: Path of the lock file
+        """
+        try:
+            return os.stat(path).st_ino == os.fstat(lock_file.fileno()).st_ino
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return False
+
+    def release(self, session_id):
+        with self._lock:
+            lock_file = self._lock_files.pop(session_id, None)
+            ring = self._rings.pop(session_id, None)
+        if ring is not None:
+            ring.close()
+        if lock_file is not None:
+            # The files are removed while the session is locked, so that they do
+            # not hold memory once the session is not streamed anymore. Workers
+            # still following the session map the ring buffer of the next owner
+            for extension in ('.ring', '.lock'):
+                try:
+                    os.unlink(self._path(session_id, extension))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:
+                        raise
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def publish(self, session_id, frame):
+        self._ring(session_id, create=True).write(frame)
+
+    def push(self, session_id, frame):
+        # The ring buffer of a session only exists while the session has an owner
+        ring = self._ring(session_id)
+        if ring is None:
+            return None
+        return ring.write(frame, pushed=True)
+
+    def pushed_at(self, session_id):
+        ring = self._ring(session_id)
+        return 0 if ring is None else ring.pushed_at
+
+    def latest(self, session_id, last_sequence):
+        ring = self._ring(session_id)
+        if ring is None:
+            return last_sequence, None
+        return ring.read_latest(last_sequence)
+
+
+def create_frame_bus(name):
+    """
+    Returns the frame bus of the given name, or None if no name is given
+    :param name: 'local', 'shm', or the dotted path of a FrameBus class
+    """
+    if not name:
+        return None
+    if name == 'local':
+        return LocalFrameBus()
+    if name == 'shm':
+        return SharedDirectoryFrameBus(settings.HISS_FRAME_BUS_DIR)
+    module_name, class_name = name.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)()
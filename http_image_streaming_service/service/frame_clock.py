@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the class in charge of pacing the frames of a stream
+"""
+
+# pylint: disable=W0403
+import math
+import numbers
+import time
+
+from settings import HISS_MAX_FRAMES_PER_SECOND
+
+try:
+    from time import monotonic as _now
+except ImportError:
+    from time import time as _now
+
+
+def is_valid_fps(fps):
+    """
+    Returns True if the given frame rate is a positive number of at most
+    HISS_MAX_FRAMES_PER_SECOND frames per second
+    :param fps: Frame rate, or None for the default frame rate
+    """
+    if fps is None:
+        return True
+    if isinstance(fps, bool) or not isinstance(fps, numbers.Real):
+        return False
+    return not math.isnan(fps) and 0 < fps <= HISS_MAX_FRAMES_PER_SECOND
+
+
+class FrameClock(object):
+    """
+    Constructor
+    :param fps: Number of frames per second
+    """
+    def __init__(self, fps):
+        self._interval = 1.0 / fps
+        self._deadline = None
+        self._skipped = 0
+
+    @property
+    def fps(self):
+        """
+        Returns the number of frames per second
+        """
+        return 1.0 / self._interval
+
+    @fps.setter
+    def fps(self, fps):
+        """
+        Changes the number of frames per second. The new rate applies from the
+        next frame
+        :param fps: Number of frames per second
+        """
+        self._interval = 1.0 / fps
+
+    @property
+    def skipped(self):
+        """
+        Returns the total number of frames skipped because the stream was late
+        """
+        return self._skipped
+
+    def wait(self):
+        """
+        Sleeps until the deadline of the next frame. Deadlines are absolute, so the
+        time spent producing a frame does not delay the following ones. When a
+        deadline has been missed, the frames that should already have been
+        produced are skipped instead of being produced in a burst
+        :return: The number of frames skipped
+        """
+        now = _now()
+        if self._deadline is None:
+            self._deadline = now
+        delay = self._deadline - now
+        skipped = 0
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            skipped = int(-delay / self._interval)
+            self._deadline += skipped * self._interval
+            self._skipped += skipped
+        self._deadline += self._interval
+        return skipped
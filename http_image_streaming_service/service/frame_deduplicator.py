@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the class in charge of detecting frames identical to the
+previous one of a stream
+"""
+
+import zlib
+
+
+def frame_digest(frame):
+    """
+    Returns a cheap, non-cryptographic digest of the given frame
+    :param frame: JPEG image
+    """
+    return len(frame), zlib.crc32(frame)
+
+
+class FrameDeduplicator(object):
+    """
+    Constructor. Each viewer has its own deduplicator, so that a frame suppressed
+    for one viewer is still sent to the others. The state is released with the
+    viewer stream
+    """
+    def __init__(self):
+        self._last_digest = None
+
+    def is_duplicate(self, frame):
+        """
+        Returns True if the given frame is identical to the previous frame of the
+        stream
+        :param frame: JPEG image
+        """
+        digest = frame_digest(frame)
+        if digest == self._last_digest:
+            return True
+        self._last_digest = digest
+        return False
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the parser of the frame streams pushed by rendering
+resources. A stream is a multipart/x-mixed-replace body, the same format as the
+streams served to the viewers, in which each part has a Content-Length header
+"""
+
+
+def read_frames(stream, boundary, max_size):
+    """
+    Reads the frames of a multipart stream as they are received
+    :param stream: File-like object from which the stream is read
+    :param boundary: Boundary of the parts, from the Content-Type of the stream
+    :param max_size: Maximum number of bytes of a frame
+    :return: A generator of the frames
+    :raise ValueError: If the stream is malformed or a frame is too large
+    """
+    delimiter = b'--' + boundary.encode('ascii')
+    while True:
+        line = stream.readline()
+        if not line:
+            return
+        line = line.strip()
+        if not line:
+            # Line break closing the previous part, or preamble
+            continue
+        if line == delimiter + b'--':
+            return
+        if line != delimiter:
+            raise ValueError('Expected boundary ' + boundary)
+        length = _read_part_length(stream)
+        if length > max_size:
+            raise ValueError('Frame of ' + str(length) + ' bytes exceeds the maximum of ' +
+                             str(max_size) + ' bytes')
+        frame = _read_exactly(stream, length)
+        if len(frame) < length:
+            raise ValueError('Stream ended in the middle of a frame')
+        yield frame
+
+
+def _read_part_length(stream):
+    """
+    Reads the headers of a part
+    :param stream: File-like object from which the stream is read
+    :return: The Content-Length of the part
+    :raise ValueError: If the part has no valid Content-Length
+    """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            raise ValueError('Stream ended in the middle of part headers')
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            try:
+                length = int(value.strip())
+            except ValueError:
+                raise ValueError('Invalid Content-Length ' + repr(value.strip()))
+    if length is None or length < 0:
+        raise ValueError('Parts must have a Content-Length header')
+    return length
+
+
+def _read_exactly(stream, length):
+    """
+    Reads the given number of bytes, unless the stream ends before
+    :param stream: File-like object from which the stream is read
+    :param length: Number of bytes to read
+    """
+    chunks = list()
+    remaining = length
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
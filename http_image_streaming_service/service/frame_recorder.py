@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the classes in charge of recording the frames of a session
+to disk, and of reading them back. A recording is made of two append-only
+files: the data file holds the frames one after the other, and the index file
+holds, for each frame, the time at which it was recorded and its position in
+the data file. Index entries are written after their frame, so that readers
+only see complete frames, and have a fixed size, so that readers can memory-map
+the index and seek to any time without reading the frames
+"""
+
+import errno
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Entry of the index: time at which the frame was recorded, position of the
+# frame in the data file, length of the frame
+_INDEX_ENTRY = struct.Struct('<dQQ')
+
+
+def recording_paths(folder, session_id):
+    """
+    Returns the paths of the data and index files of the recording of a session
+    :param folder: Folder of the recordings
+    :param session_id: Id of the session
+    """
+    name = os.path.join(folder, hashlib.sha1(str(session_id).encode('utf-8')).hexdigest())
+    return name + '.frames', name + '.index'
+
+
+class FrameRecorder(object):
+    """
+    Constructor. Appends frames to the recording of a session, creating it if
+    needed. A recording is written by a single recorder at a time, whatever the
+    process
+    :param folder: Folder of the recordings
+    :param session_id: Id of the session
+    :raise IOError: If the recording is being written by another recorder
+    """
+    def __init__(self, folder, session_id):
+        try:
+            os.makedirs(folder)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        data_path, index_path = recording_paths(folder, session_id)
+        self._index = open(index_path, 'ab')
+        try:
+            fcntl.flock(self._index, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            self._index.close()
+            raise
+        # Drops the last entry if a previous recorder died while writing it
+        size = os.fstat(self._index.fileno()).st_size
+        self._index.truncate(size - size % _INDEX_ENTRY.size)
+        self._data = open(data_path, 'ab')
+        self._data.seek(0, os.SEEK_END)
+        self._offset = self._data.tell()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def record(self, frame, timestamp=None):
+        """
+        Appends a frame to the recording. Frames recorded after the recorder was
+        closed are ignored
+        :param frame: JPEG image
+        :param timestamp: Time at which the frame was produced, now by default
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._data.write(frame)
+            self._data.flush()
+            self._index.write(_INDEX_ENTRY.pack(timestamp or time.time(), self._offset,
+                                                len(frame)))
+            self._index.flush()
+            self._offset += len(frame)
+
+    def close(self):
+        """
+        Stops recording and releases the recording
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._data.close()
+            fcntl.flock(self._index, fcntl.LOCK_UN)
+            self._index.close()
+
+
+class RecordingReader(object):
+    """
+    Constructor. Reads the frames of the recording of a session, possibly while
+    it is being written
+    :param folder: Folder of the recordings
+    :param session_id: Id of the session
+    :raise IOError: If the session has no recording
+    """
+    def __init__(self, folder, session_id):
+        data_path, index_path = recording_paths(folder, session_id)
+        self._index = open(index_path, 'rb')
+        self._data = open(data_path, 'rb')
+        self._map = None
+        self._count = 0
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Maps the entries added to the index since it was last mapped
+        """
+        count = os.fstat(self._index.fileno()).st_size // _INDEX_ENTRY.size
+        if count > self._count:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._index.fileno(), count * _INDEX_ENTRY.size,
+                                  access=mmap.ACCESS_READ)
+            self._count = count
+
+    def __len__(self):
+        """
+        Returns the number of frames of the recording
+        """
+        self._refresh()
+        return self._count
+
+    def timestamp(self, index):
+        """
+        Returns the time at which a frame was recorded
+        :param index: Index of the frame
+        """
+        return _INDEX_ENTRY.unpack_from(self._map, index * _INDEX_ENTRY.size)[0]
+
+    def frame(self, index):
+        """
+        Returns a recorded frame
+        :param index: Index of the frame
+        """
+        _, offset, length = _INDEX_ENTRY.unpack_from(self._map, index * _INDEX_ENTRY.size)
+        self._data.seek(offset)
+        return self._data.read(length)
+
+    def seek(self, timestamp):
+        """
+        Returns the index of the first frame recorded at or after the given time
+        :param timestamp: Time, in seconds since the epoch
+        """
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def close(self):
+        """
+        Closes the recording
+        """
+        if self._map is not None:
+            self._map.close()
+        self._index.close()
+        self._data.close()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the ring buffer in which the owner of a session writes the
+frames read by the other worker processes. The buffer is a preallocated,
+memory-mapped file: the writer copies each frame once into the mapping, and
+each reader copies it once out of the mapping, without any file being opened,
+allocated or renamed per frame
+"""
+
+import errno
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Header of the buffer: number of frames written, number of bytes written,
+# number of bytes written once the frame being written is complete, time at
+# which the latest pushed frame was written
+_HEADER = struct.Struct('<QQQd')
+
+# Entry of the frame index: sequence number, position in bytes written, length
+_ENTRY = struct.Struct('<QQQ')
+
+
+class FrameRingBuffer(object):
+    """
+    Constructor. Opens the buffer stored in the given file, creating it if needed
+    :param path: Path of the file backing the buffer, preferably on a memory file
+                 system
+    :param capacity: Number of bytes available for the frames
+    :param slots: Number of frames indexed in the buffer
+    :param first_sequence: Sequence number after which the frames of the buffer
+                           are numbered, if the buffer is created
+    """
+    def __init__(self, path, capacity, slots=16, first_sequence=0):
+        self._capacity = capacity
+        self._slots = slots
+        self._data_offset = _HEADER.size + slots * _ENTRY.size
+        size = self._data_offset + capacity
+        # The file stays open, as writes are serialized with a lock on it
+        try:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            created = True
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+            self._fd = os.open(path, os.O_RDWR)
+            created = False
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._write_lock = threading.Lock()
+        self._inode = os.fstat(self._fd).st_ino
+        if created and first_sequence:
+            self._pack(_HEADER, 0, first_sequence, 0, 0, 0)
+
+    @property
+    def inode(self):
+        """
+        Returns the inode of the file backing the buffer
+        """
+        return self._inode
+
+    def _entry_offset(self, sequence):
+        """
+        Returns the position of the index entry of the given frame
+        :param sequence: Sequence number of the frame
+        """
+        return _HEADER.size + (sequence % self._slots) * _ENTRY.size
+
+    def _pack(self, structure, offset, *values):
+        """
+        Writes values in the mapping with a single copy. pack_into is not used, as
+        it clears the bytes before writing them, and readers could see the zeros
+        :param structure: Struct of the values
+        :param offset: Position of the values in the mapping
+        """
+        self._map[offset:offset + structure.size] = structure.pack(*values)
+
+    def _unpack(self, structure, offset):
+        """
+        Reads values from the mapping with a single copy
+        :param structure: Struct of the values
+        :param offset: Position of the values in the mapping
+        """
+        return structure.unpack(self._map[offset:offset + structure.size])
+
+    @property
+    def pushed_at(self):
+        """
+        Returns the time at which the latest pushed frame was written, or 0
+        """
+        return self._unpack(_HEADER, 0)[3]
+
+    def write(self, frame, pushed=False):
+        """
+        Appends a frame to the buffer. Writers of all the processes are serialized
+        :param frame: JPEG image
+        :param pushed: True if the frame was pushed by the rendering resource
+        :return: The sequence number of the frame
+        :raise ValueError: If the frame is larger than the buffer
+        """
+        length = len(frame)
+        if length > self._capacity:
+            raise ValueError('Frame of ' + str(length) + ' bytes does not fit in a ' +
+                             str(self._capacity) + ' bytes buffer')
+        # The file lock serializes the processes, the thread lock the threads of
+        # this process, which share the same open file
+        with self._write_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                return self._write(frame, pushed)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _write(self, frame, pushed):
+        """
+        Appends a frame to the buffer. Must be called with the write locks held
+        :param frame: JPEG image
+        :param pushed: True if the frame was pushed by the rendering resource
+        :return: The sequence number of the frame
+        """
+        length = len(frame)
+        sequence, written, _, pushed_at = self._unpack(_HEADER, 0)
+        if pushed:
+            pushed_at = time.time()
+        position = written
+        offset = position % self._capacity
+        if offset + length > self._capacity:
+            # Frames are contiguous, so that they can be read as a single view
+            position += self._capacity - offset
+            offset = 0
+        # The bytes about to be overwritten are reserved before being copied, so
+        # that readers copying them at the same time discard their copy
+        self._pack(_HEADER, 0, sequence, written, position + length, pushed_at)
+        start = self._data_offset + offset
+        self._map[start:start + length] = frame
+        sequence += 1
+        self._pack(_ENTRY, self._entry_offset(sequence), sequence, position, length)
+        # The header is updated last: readers only see complete frames
+        self._pack(_HEADER, 0, sequence, position + length, position + length, pushed_at)
+        return sequence
+
+    def read_latest(self, last_sequence=0):
+        """
+        Returns a copy of the most recent frame
+        :param last_sequence: Sequence number of the last frame read
+        :return: A (sequence, frame) tuple. The frame is None if no frame more
+                 recent than the given sequence was written
+        """
+        while True:
+            sequence, written = self._unpack(_HEADER, 0)[:2]
+            if written == 0 or sequence == last_sequence:
+                return last_sequence, None
+            entry_sequence, position, length = self._unpack(_ENTRY,
+                                                            self._entry_offset(sequence))
+            if entry_sequence != sequence:
+                # The writer is updating the entry
+                continue
+            start = self._data_offset + position % self._capacity
+            frame = self._map[start:start + length]
+            # The copy is only valid if the writer did not start overwriting it
+            reserved = self._unpack(_HEADER, 0)[2]
+            if reserved - position <= self._capacity:
+                return sequence, frame
+
+    def close(self):
+        """
+        Unmaps the buffer and closes its file
+        """
+        self._map.close()
+        os.close(self._fd)
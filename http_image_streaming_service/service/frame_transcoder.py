@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the functions in charge of resizing and re-encoding frames
+for viewers that do not need the native image of the rendering resource
+"""
+
+from collections import namedtuple
+from io import BytesIO
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from settings import HISS_TRANSCODING_MAX_SIZE
+
+
+class FrameTier(namedtuple('FrameTier', ['width', 'height', 'quality'])):
+    """
+    Maximum size and JPEG quality of the frames sent to a viewer. None values
+    keep the native size or quality
+    """
+    __slots__ = ()
+
+    @property
+    def is_native(self):
+        """
+        Returns True if frames of this tier are sent as produced by the rendering
+        resource
+        """
+        return self.width is None and self.height is None and self.quality is None
+
+
+NATIVE_TIER = FrameTier(None, None, None)
+
+
+def _parse_int(args, name, minimum, maximum):
+    """
+    Returns the value of an optional integer argument
+    :param args: Arguments of the request
+    :param name: Name of the argument
+    :param minimum: Minimum accepted value
+    :param maximum: Maximum accepted value
+    :raise ValueError: If the argument is not an integer in the accepted range
+    """
+    value = args.get(name)
+    if value is None:
+        return None
+    value = int(value)
+    if value < minimum or value > maximum:
+        raise ValueError(name + ' must be between ' + str(minimum) + ' and ' + str(maximum))
+    return value
+
+
+def parse_tier(args):
+    """
+    Returns the tier described by the width, height and quality arguments of a
+    request
+    :param args: Arguments of the request
+    :raise ValueError: If one of the arguments is invalid
+    """
+    return FrameTier(_parse_int(args, 'width', 1, HISS_TRANSCODING_MAX_SIZE),
+                     _parse_int(args, 'height', 1, HISS_TRANSCODING_MAX_SIZE),
+                     _parse_int(args, 'quality', 1, 95))
+
+
+def is_available():
+    """
+    Returns True if the imaging library required for transcoding is installed
+    """
+    return Image is not None
+
+
+def transcode(frame, tier):
+    """
+    Returns the given frame resized to fit in the tier, keeping its aspect ratio,
+    and encoded with the quality of the tier. Frames are never enlarged
+    :param frame: JPEG image
+    :param tier: Tier of the returned image
+    """
+    image = Image.open(BytesIO(frame))
+    width, height = image.size
+    image.thumbnail((tier.width or width, tier.height or height), Image.ANTIALIAS)
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=tier.quality or 75)
+    return output.getvalue()
@@ -27,15 +27,33 @@ This module contains the actual application that serves the HTTP requests
 
 # pylint: disable=W0403
 import json
-import hashlib
+import math
+import socket
+import threading
+import time
 import requests
+from requests.compat import urlencode
 
 from flask import Flask, request, Response, make_response
 import os
 import custom_logging as log
+import frame_ingestion
+import frame_transcoder
+import metrics
 import settings
 from route_manager import RouteManager
+from route_supervisor import RouteSupervisor
+from snapshot_cache import SnapshotCache
+from admission_controller import AdmissionController
+from circuit_breaker import CircuitOpenError
 from rest_frame_grabber import RestFrameGrabber
+from frame_broadcaster import BroadcasterRegistry
+from frame_bus import create_frame_bus
+from frame_deduplicator import FrameDeduplicator, frame_digest
+from adaptive_quality import AdaptiveQuality
+from frame_clock import FrameClock, is_valid_fps
+from frame_recorder import FrameRecorder, RecordingReader
+from websocket_viewer import ViewerControl, pack_frame
 
 # Contains the default 'not found' image
 frame_not_found = open(os.path.dirname(__file__) +
@@ -43,69 +61,454 @@ frame_not_found = open(os.path.dirname(__file__) +
 
 application = Flask(__name__)
 
-# Create database
-import sqlite3
+route_manager = RouteManager()
+broadcasters = BroadcasterRegistry(route_manager, frame_not_found, application,
+                                   create_frame_bus(settings.HISS_FRAME_BUS))
+snapshots = SnapshotCache(broadcasters)
+admission = AdmissionController()
 
-conn = sqlite3.connect(settings.HISS_DB)
-try:
-    conn.execute('create table routes (session_id text, uri text)')
-except sqlite3.OperationalError as e:
-    log.info(1, e)
+# Probes the rendering resources of the routes. Started by the entry points of
+# the service
+supervisor = RouteSupervisor(route_manager, application)
 
-route_manager = RouteManager()
 
+# Boundary and headers preceding each frame of the multipart stream
+_PART_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+
+# Line break closing each frame of the multipart stream
+_PART_TRAILER = b'\r\n'
 
-def streamer(session_id, frame_grabber):
+
+def streamer(session_id, frame_grabber, tier=frame_transcoder.NATIVE_TIER, ticket=None):
     """
-    Serves a given image stream
+    Serves a given image stream. All the viewers of a session share the same
+    broadcaster, and therefore the same upstream frame grabber. A viewer always
+    receives the most recent frame: frames produced while the previous one was
+    being written to a slow viewer are dropped for that viewer only
     :param session_id: Id of the session to stream
     :param frame_grabber: Implementation of the class in charge of fetching the images
+    :param tier: Size and quality of the frames sent to the viewer
+    :param ticket: Admission of the stream, released when the stream ends. The
+                   stream stops when its ticket is reaped
     """
-    while route_manager.get_route(session_id):
-        with application.app_context():
-            try:
-                frame = frame_grabber.get_frame()
-                # Optimization: Generate an MD5 for the current frame and push
-                # it to the client only if it is different from the previous
-                # one
-                if frame is not None:
-                    push_frame = True
-                    if settings.HISS_STREAMING_OPTIMIZATION:
-                        frame_md5 = int(hashlib.md5(frame).hexdigest(), 16)
-                        if route_manager.get_frame_md5(session_id) != frame_md5:
-                            route_manager.set_frame_md5(session_id, frame_md5)
-                        else:
-                            push_frame = False
-                    if push_frame:
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            except KeyError:
-                # Returns an empty frame
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_not_found + b'\r\n')
-            except ValueError as e:
-                log.error(str(e))
-            except requests.exceptions as e:
-                log.error('Removing route for session ' + str(session_id))
-                route_manager.delete_route(session_id)
+    broadcaster = _subscribe(session_id, frame_grabber, ticket)
+    deduplicator = FrameDeduplicator()
+    adaptive_quality = None
+    if settings.HISS_ADAPTIVE_QUALITY and frame_transcoder.is_available():
+        adaptive_quality = AdaptiveQuality(tier)
+    frames_sent = metrics.FRAMES_SENT.labels(session_id)
+    frames_suppressed = metrics.FRAMES_SUPPRESSED.labels(session_id)
+    frames_dropped = metrics.FRAMES_DROPPED.labels(session_id)
+    bytes_sent = metrics.BYTES_SENT.labels(session_id)
+    try:
+        sequence = 0
+        last_frame = None
+        while ticket is None or not ticket.released:
+            if adaptive_quality is not None:
+                tier = adaptive_quality.tier
+            previous_sequence = sequence
+            sequence, frame = broadcaster.wait_for_frame(sequence, tier=tier)
+            dropped = 0
+            if frame is None:
+                if not broadcaster.running:
+                    break
+                if last_frame is None or not _keep_alive_due(ticket):
+                    continue
+                frame = last_frame
+            else:
+                if previous_sequence > 0:
+                    dropped = sequence - previous_sequence - 1
+                    frames_dropped.inc(dropped)
+                # Optimization: Push the frame to the client only if it is different
+                # from the previous one
+                if settings.HISS_STREAMING_OPTIMIZATION and \
+                        deduplicator.is_duplicate(frame) and not _keep_alive_due(ticket):
+                    frames_suppressed.inc()
+                    continue
+            last_frame = frame
+            # The frame is yielded on its own so that the object shared by all
+            # the viewers of the session is written as is, without being copied
+            # into a per-viewer chunk. The server resumes the generator once a
+            # chunk has been written
+            start = time.time()
+            yield _PART_HEADER
+            yield frame
+            yield _PART_TRAILER
+            if ticket is not None:
+                ticket.touch()
+            frames_sent.inc()
+            bytes_sent.inc(len(_PART_HEADER) + len(frame) + len(_PART_TRAILER))
+            if adaptive_quality is not None:
+                adaptive_quality.update(time.time() - start,
+                                        1.0 / route_manager.get_route_fps(session_id),
+                                        dropped)
+    finally:
+        _unsubscribe(broadcaster, ticket)
+
+
+def replayer(reader, speed=1.0, start=0, loop=False, ticket=None):
+    """
+    Serves a recorded session as the multipart stream of a live session. Frames
+    are sent at the pace at which they were recorded, accelerated by the given
+    speed factor. Pauses longer than HISS_REPLAY_MAX_GAP are shortened
+    :param reader: Reader of the recording, closed when the stream ends
+    :param speed: Speed factor of the replay
+    :param start: Number of seconds of the recording to skip
+    :param loop: True to replay the recording until the viewer leaves
+    :param ticket: Admission of the stream, released when the stream ends
+    """
+    speed = float(speed)
+    try:
+        elapsed = 0
+        started = time.time()
+        while True:
+            index = reader.seek(reader.timestamp(0) + start)
+            if index >= len(reader):
                 break
-            except IOError:
-                log.error('Lost connection with rendering resource. ' +
-                          'Removing route for session ' +
-                          str(session_id))
-                route_manager.delete_route(session_id)
+            previous_timestamp = None
+            while index < len(reader) and (ticket is None or not ticket.released):
+                timestamp = reader.timestamp(index)
+                if previous_timestamp is not None:
+                    elapsed += min(timestamp - previous_timestamp,
+                                   settings.HISS_REPLAY_MAX_GAP) / speed
+                previous_timestamp = timestamp
+                _wait_until(started + elapsed, ticket)
+                frame = reader.frame(index)
+                yield _PART_HEADER
+                yield frame
+                yield _PART_TRAILER
+                if ticket is not None:
+                    ticket.touch()
+                index += 1
+            if not loop or (ticket is not None and ticket.released):
                 break
+            # The replay starts again after the mean interval between the frames,
+            # so that a recording made of a single frame is paced too
+            count = len(reader)
+            interval = (reader.timestamp(count - 1) - reader.timestamp(0)) / (count - 1) \
+                if count > 1 else 0
+            if interval <= 0 or interval > settings.HISS_REPLAY_MAX_GAP:
+                interval = settings.HISS_REPLAY_MAX_GAP
+            elapsed += interval / speed
+    finally:
+        reader.close()
+        if ticket is not None:
+            admission.release(ticket)
+
+
+def _wait_until(deadline, ticket):
+    """
+    Sleeps until the given time. The ticket is touched while waiting, so that a
+    slow replay is not reaped
+    :param deadline: Time until which to sleep, in seconds since the epoch
+    :param ticket: Admission of the stream, or None
+    """
+    delay = deadline - time.time()
+    while delay > 0:
+        if ticket is not None:
+            if ticket.released:
+                return
+            ticket.touch()
+        if settings.HISS_STREAM_IDLE_TIMEOUT > 0:
+            delay = min(delay, settings.HISS_STREAM_IDLE_TIMEOUT / 2.0)
+        time.sleep(delay)
+        delay = deadline - time.time()
+
+
+def _subscribe(session_id, frame_grabber, ticket):
+    """
+    Attaches a viewer to the broadcaster of the given session. The viewer is
+    detached when its ticket is released, even if its stream is blocked writing
+    to a client that stopped reading
+    :param session_id: Id of the session to stream
+    :param frame_grabber: Implementation of the class in charge of fetching the images
+    :param ticket: Admission of the stream, or None
+    :return: The broadcaster of the session
+    """
+    broadcaster = broadcasters.subscribe(session_id, frame_grabber)
+    if ticket is not None:
+        ticket.on_release = lambda: broadcasters.unsubscribe(broadcaster)
+    return broadcaster
+
+
+def _unsubscribe(broadcaster, ticket):
+    """
+    Detaches a viewer from its broadcaster when its stream ends
+    :param broadcaster: Broadcaster returned by _subscribe
+    :param ticket: Admission of the stream, or None
+    """
+    if ticket is None:
+        broadcasters.unsubscribe(broadcaster)
+    else:
+        admission.release(ticket)
+
+
+def _keep_alive_due(ticket):
+    """
+    Returns True if the last frame has to be sent again, so that the stream of
+    an unchanged session is not reaped
+    :param ticket: Admission of the stream, or None
+    """
+    return ticket is not None and settings.HISS_STREAM_IDLE_TIMEOUT > 0 and \
+        ticket.idle(settings.HISS_STREAM_IDLE_TIMEOUT / 2.0)
+
+
+def websocket_streamer(websocket, session_id, frame_grabber, tier=frame_transcoder.NATIVE_TIER,
+                       ticket=None):
+    """
+    Serves a given image stream to a WebSocket viewer. Unlike the MJPEG streamer,
+    the frame rate, size and quality of the frames are set by the viewer, which
+    may also throttle the stream by acknowledging the frames it displays
+    :param websocket: WebSocket of the viewer
+    :param session_id: Id of the session to stream
+    :param frame_grabber: Implementation of the class in charge of fetching the images
+    :param tier: Initial size and quality of the frames sent to the viewer
+    :param ticket: Admission of the stream, released when the stream ends. The
+                   stream stops when its ticket is reaped
+    """
+    broadcaster = _subscribe(session_id, frame_grabber, ticket)
+    control = ViewerControl(tier)
+    receiver = threading.Thread(target=_receive_messages, args=(websocket, control),
+                                name='websocket-' + str(session_id))
+    receiver.daemon = True
+    receiver.start()
+    deduplicator = FrameDeduplicator()
+    clock = None
+    frames_sent = metrics.FRAMES_SENT.labels(session_id)
+    frames_suppressed = metrics.FRAMES_SUPPRESSED.labels(session_id)
+    frames_dropped = metrics.FRAMES_DROPPED.labels(session_id)
+    bytes_sent = metrics.BYTES_SENT.labels(session_id)
+    try:
+        sequence = 0
+        last_frame = None
+        while not websocket.closed and (ticket is None or not ticket.released):
+            if not control.wait_for_window(settings.HISS_SUBSCRIBER_TIMEOUT):
+                continue
+            if control.fps is not None:
+                if clock is None:
+                    clock = FrameClock(control.fps)
+                clock.fps = control.fps
+                clock.wait()
+            previous_sequence = sequence
+            sequence, frame = broadcaster.wait_for_frame(sequence, tier=control.tier)
+            if frame is None:
+                if not broadcaster.running:
+                    break
+                if last_frame is None or not _keep_alive_due(ticket):
+                    continue
+                frame = last_frame
+            else:
+                if previous_sequence > 0:
+                    frames_dropped.inc(sequence - previous_sequence - 1)
+                if settings.HISS_STREAMING_OPTIMIZATION and \
+                        deduplicator.is_duplicate(frame) and not _keep_alive_due(ticket):
+                    frames_suppressed.inc()
+                    continue
+            last_frame = frame
+            message = pack_frame(sequence, frame)
+            control.sent(sequence)
+            websocket.send(message, binary=True)
+            if ticket is not None:
+                ticket.touch()
+            frames_sent.inc()
+            bytes_sent.inc(len(message))
+    except socket.error as e:
+        log.info(1, 'WebSocket viewer of session %s left: %s', session_id, e)
+    finally:
+        control.close()
+        _unsubscribe(broadcaster, ticket)
+
+
+def _receive_messages(websocket, control):
+    """
+    Applies the messages sent by a WebSocket viewer until the WebSocket is closed
+    :param websocket: WebSocket of the viewer
+    :param control: Settings of the viewer
+    """
+    try:
+        while True:
+            message = websocket.receive()
+            if message is None:
+                break
+            try:
+                control.handle_message(message)
+            except ValueError as e:
+                log.error('Invalid message from WebSocket viewer: %s', e)
+    except socket.error:
+        pass
+    finally:
+        control.close()
 
 
 @application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
                    '/routes', methods=['GET'])
 def list_routes():
     """
-    Lists existing routes. No session ID is required
+    Lists existing routes, ordered by session id. No session ID is required.
+    The optional arguments of the request are:
+    prefix: Only lists the sessions whose id starts with the prefix
+    limit: Maximum number of routes listed. When more routes are available, the
+           Link header of the response holds the URL of the next page
+    after: Only lists the sessions whose id follows the given one
+    health: Adds the result of the latest liveness probe of each route
+    format: 'json' for a JSON array (default), 'ndjson' for one route per line
+    The listing is streamed, so that its cost does not depend on the number of routes
     """
-    if request.method == 'GET':
-        response = route_manager.list_routes()
-        return make_response(response, 200)
+    limit = request.args.get('limit')
+    output_format = request.args.get('format', 'json')
+    try:
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1 or limit > settings.HISS_ROUTES_PAGE_SIZE:
+                raise ValueError('limit must be between 1 and ' +
+                                 str(settings.HISS_ROUTES_PAGE_SIZE))
+        if output_format not in ('json', 'ndjson'):
+            raise ValueError('format must be json or ndjson')
+    except ValueError as e:
+        response = 'Error: ' + str(e)
+        log.error(response)
+        return make_response(response, 400)
+    health = request.args.get('health', 'false').lower() in ('1', 'true')
+    prefix = request.args.get('prefix')
+    after = request.args.get('after')
+    headers = dict()
+    if limit is None:
+        routes = route_manager.iter_routes(prefix, after, health=health)
+    else:
+        # A page is small enough to be read before the response is sent, one
+        # more route telling whether there is a next page
+        routes = list(route_manager.iter_routes(prefix, after, limit + 1, health))
+        if len(routes) > limit:
+            routes = routes[:limit]
+            # urlencode only accepts ASCII unicode values
+            arguments = dict((name, value.encode('utf-8'))
+                             for name, value in request.args.items())
+            arguments['after'] = routes[-1][0].encode('utf-8')
+            headers['Link'] = '<' + request.base_url + '?' + \
+                urlencode(sorted(arguments.items())) + '>; rel="next"'
+    if output_format == 'ndjson':
+        return Response(_format_routes(routes, '', '\n', '\n', ''),
+                        mimetype='application/x-ndjson', headers=headers)
+    return Response(_format_routes(routes, '[', ', ', '', ']'),
+                    mimetype='application/json', headers=headers)
+
+
+def _format_routes(routes, start, separator, end, closing):
+    """
+    Formats the given routes in chunks of HISS_ROUTES_PAGE_SIZE routes
+    :param routes: Iterable of the routes
+    :param start: Text preceding the first route
+    :param separator: Text between two routes
+    :param end: Text following the last route, if any
+    :param closing: Text following the listing
+    :return: A generator of the chunks of the listing
+    """
+    chunk = [start]
+    count = 0
+    for route in routes:
+        if count > 0:
+            chunk.append(separator)
+        chunk.append(json.dumps(route))
+        count += 1
+        if count % settings.HISS_ROUTES_PAGE_SIZE == 0:
+            yield ''.join(chunk)
+            chunk = list()
+    if count > 0:
+        chunk.append(end)
+    chunk.append(closing)
+    yield ''.join(chunk)
+
+
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/routes', methods=['POST', 'DELETE'])
+def bulk_route_management():
+    """
+    Manages many routes at once, in a single transaction, according to the
+    request type. No session ID is required:
+    POST: Create or replace the routes of a JSON array of
+          {"session_id": ..., "uri": ..., "fps": ...} objects, fps being optional
+    DELETE: Remove the routes of a JSON array of session ids
+    The response is a JSON array holding the result of each item
+    """
+    try:
+        items = json.loads(request.data)
+    except ValueError:
+        items = None
+    if not isinstance(items, list):
+        response = 'Error: A JSON array must be provided for bulk operations'
+        log.error(response)
+        return make_response(response, 400)
+    if len(items) > settings.HISS_BULK_MAX_ROUTES:
+        response = 'Error: At most ' + str(settings.HISS_BULK_MAX_ROUTES) + \
+            ' routes can be managed by a single request'
+        log.error(response)
+        return make_response(response, 413)
+    if request.method == 'POST':
+        results = _create_routes(items)
+    else:
+        results = _delete_routes(items)
+    return make_response(json.dumps(results), 200)
+
+
+def _create_routes(items):
+    """
+    Creates or replaces the valid routes of a bulk request
+    :param items: Routes of the request
+    :return: The result of each item
+    """
+    routes = list()
+    results = list()
+    for item in items:
+        if not isinstance(item, dict) or not _is_non_empty_string(item.get('session_id')) or \
+                not _is_non_empty_string(item.get('uri')):
+            session_id = item.get('session_id') if isinstance(item, dict) else None
+            if not _is_non_empty_string(session_id):
+                session_id = None
+            results.append({'session_id': session_id, 'status': 400,
+                            'contents': 'Error: session_id and uri must be non-empty strings'})
+        elif not is_valid_fps(item.get('fps')):
+            results.append({'session_id': item['session_id'], 'status': 400,
+                            'contents': 'Error: fps must be a positive number of at most ' +
+                                        str(settings.HISS_MAX_FRAMES_PER_SECOND)})
+        else:
+            routes.append((item['session_id'], item['uri'], item.get('fps')))
+            results.append({'session_id': item['session_id'], 'status': 201,
+                            'contents': 'Route ' + item['uri'] + ' successfully added'})
+    if routes:
+        route_manager.create_routes(routes)
+    return results
+
+
+def _delete_routes(items):
+    """
+    Removes the routes of a bulk request
+    :param items: Session ids of the request
+    :return: The result of each item
+    """
+    session_ids = [item for item in items if _is_non_empty_string(item)]
+    existing = route_manager.delete_routes(session_ids) if session_ids else set()
+    for session_id in existing:
+        broadcasters.remove_session(session_id)
+    results = list()
+    for item in items:
+        if item not in session_ids:
+            results.append({'session_id': None, 'status': 400,
+                            'contents': 'Error: Session ids must be non-empty strings'})
+        elif item in existing:
+            results.append({'session_id': item, 'status': 200,
+                            'contents': 'Route ' + item + ' successfully removed'})
+        else:
+            results.append({'session_id': item, 'status': 404,
+                            'contents': 'Error: No route for session ' + item})
+    return results
+
+
+def _is_non_empty_string(value):
+    """
+    Returns True if the given value of a bulk request is a non-empty string
+    :param value: Value decoded from the JSON request
+    """
+    return isinstance(value, type(u'')) and len(value) > 0
 
 
 @application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
@@ -134,39 +537,296 @@ def route_management():
             return make_response(response, 401)
         json_data = json.loads(request.data)
         uri = json_data['uri']
-        log.info(1, 'Creating new route for ' + uri)
-        response = route_manager.create_route(session_id, uri)
+        fps = json_data.get('fps')
+        if not is_valid_fps(fps):
+            response = 'Error: fps must be a positive number of at most ' + \
+                str(settings.HISS_MAX_FRAMES_PER_SECOND)
+            log.error(response)
+            return make_response(response, 400)
+        log.info(1, 'Creating new route for %s', uri)
+        response = route_manager.create_route(session_id, uri, fps)
         return make_response(response, 201)
     else:
+        broadcasters.remove_session(session_id)
         return route_manager.delete_route(session_id)
 
 
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/metrics', methods=['GET'])
+def metrics_report():
+    """
+    Reports the metrics of the service in the Prometheus text format
+    """
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+
 @application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
                    '/image_streaming_feed/<string:session_id>')
 def image_streaming_feed(session_id):
     """
-    Handles the image stream according to the given session
+    Handles the image stream according to the given session. The optional width,
+    height and quality arguments of the request reduce the size of the frames
+    sent to the viewer
     :param session_id: Id of the session to stream
     """
     log.info(1, 'Getting stream')
+    try:
+        tier = frame_transcoder.parse_tier(request.args)
+    except ValueError as e:
+        response = 'Error: ' + str(e)
+        log.error(response)
+        return make_response(response, 400)
+    if not tier.is_native and not frame_transcoder.is_available():
+        response = 'Error: Frame transcoding is not available on this server'
+        log.error(response)
+        return make_response(response, 501)
     if session_id == 'demo':
         log.info(1, 'Creating local streamer')
         uri = 'http://' + settings.HISS_HOSTNAME + ':5000'
         route_manager.create_route(session_id, uri)
     else:
-        log.info(1, 'Creating streamer for ' + str(session_id))
+        log.info(1, 'Creating streamer for %s', session_id)
+        uri = route_manager.get_route_target(session_id)
+    ticket = admission.admit(session_id, _client_address())
+    if ticket is None:
+        return _too_many_streams(session_id)
+    return Response(streamer(session_id, RestFrameGrabber(uri), tier, ticket),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+def _client_address():
+    """
+    Returns the address of the client of the request. Behind trusted proxies, the
+    client is the last address of the X-Forwarded-For header that was not added
+    by a trusted proxy
+    """
+    address = request.remote_addr
+    forwarded = request.headers.get('X-Forwarded-For')
+    if not forwarded or address not in settings.HISS_TRUSTED_PROXIES:
+        return address
+    for forwarded_address in reversed(forwarded.split(',')):
+        address = forwarded_address.strip()
+        if address not in settings.HISS_TRUSTED_PROXIES:
+            break
+    return address
+
+
+def _too_many_streams(session_id):
+    """
+    Returns the response refusing a stream because the session or the client
+    already has too many streams
+    :param session_id: Id of the session
+    """
+    response = make_response('Error: Too many streams for session ' + session_id +
+                             ' or client ' + str(_client_address()), 429)
+    response.headers['Retry-After'] = str(settings.HISS_STREAM_RETRY_AFTER)
+    return response
+
+
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/snapshot/<string:session_id>')
+def snapshot(session_id):
+    """
+    Returns the latest frame of the given session without opening a stream. The
+    frame is only fetched from the rendering resource if the session is neither
+    streamed nor pushed, and was not fetched recently
+    :param session_id: Id of the session
+    """
+    try:
         uri = route_manager.get_route_target(session_id)
-    return Response(streamer(session_id, RestFrameGrabber(uri)),
+    except KeyError:
+        response = 'Error: No route for session ' + session_id
+        log.error(response)
+        return make_response(response, 404)
+    try:
+        frame = snapshots.get(session_id, lambda: RestFrameGrabber(uri))
+    except (KeyError, CircuitOpenError):
+        frame = None
+    except (requests.exceptions.RequestException, IOError, ValueError) as e:
+        response = 'Error: Failed to fetch frame of session ' + session_id + ': ' + str(e)
+        log.error(response)
+        return make_response(response, 502)
+    if frame is None:
+        frame = frame_not_found
+    response = Response(frame, mimetype='image/jpeg')
+    size, checksum = frame_digest(frame)
+    response.set_etag('%x-%x' % (size, checksum & 0xffffffff))
+    response.headers['Cache-Control'] = 'max-age=' + str(settings.HISS_SNAPSHOT_TTL)
+    return response.make_conditional(request)
+
+
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/recording/<string:session_id>', methods=['POST', 'DELETE'])
+def recording_management(session_id):
+    """
+    Manages the recording of the given session according to the request type:
+    POST: Start recording the frames streamed to the viewers of the session, or
+          pushed by its rendering resource. Frames are appended to the existing
+          recording of the session, if any
+    DELETE: Stop recording
+    :param session_id: Id of the session
+    """
+    if request.method == 'DELETE':
+        if not broadcasters.stop_recording(session_id):
+            response = 'Error: Session ' + session_id + ' is not being recorded'
+            log.error(response)
+            return make_response(response, 404)
+        return make_response('Recording of session ' + session_id + ' stopped', 200)
+    try:
+        route_manager.get_route(session_id)
+    except KeyError:
+        response = 'Error: No route for session ' + session_id
+        log.error(response)
+        return make_response(response, 404)
+    try:
+        recorder = FrameRecorder(settings.HISS_RECORDING_DIR, session_id)
+    except IOError as e:
+        response = 'Error: Session ' + session_id + ' cannot be recorded: ' + str(e)
+        log.error(response)
+        return make_response(response, 409)
+    if not broadcasters.start_recording(session_id, recorder):
+        recorder.close()
+        response = 'Error: Session ' + session_id + ' is already being recorded'
+        log.error(response)
+        return make_response(response, 409)
+    return make_response('Recording of session ' + session_id + ' started', 201)
+
+
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/replay/<string:session_id>')
+def replay(session_id):
+    """
+    Streams the recording of the given session. The optional speed argument of
+    the request accelerates the replay, start skips the given number of seconds
+    of the recording, and loop=true replays the recording until the viewer leaves
+    :param session_id: Id of the recorded session
+    """
+    try:
+        speed = float(request.args.get('speed', 1))
+        start = float(request.args.get('start', 0))
+        if not 0 < speed <= settings.HISS_REPLAY_MAX_SPEED or \
+                math.isnan(start) or math.isinf(start) or start < 0:
+            raise ValueError()
+    except ValueError:
+        response = 'Error: speed must be a number between 0 and ' + \
+            str(settings.HISS_REPLAY_MAX_SPEED) + ', and start a positive number'
+        log.error(response)
+        return make_response(response, 400)
+    try:
+        reader = RecordingReader(settings.HISS_RECORDING_DIR, session_id)
+    except IOError:
+        reader = None
+    if reader is None or len(reader) == 0:
+        if reader is not None:
+            reader.close()
+        response = 'Error: No recording for session ' + session_id
+        log.error(response)
+        return make_response(response, 404)
+    duration = reader.timestamp(len(reader) - 1) - reader.timestamp(0)
+    if start > duration:
+        reader.close()
+        response = 'Error: start must not exceed the duration of the recording (' + \
+            str(duration) + ' seconds)'
+        log.error(response)
+        return make_response(response, 400)
+    ticket = admission.admit(session_id, _client_address())
+    if ticket is None:
+        reader.close()
+        return _too_many_streams(session_id)
+    log.info(1, 'Replaying session %s at speed %g', session_id, speed)
+    return Response(replayer(reader, speed, start, request.args.get('loop') == 'true', ticket),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/image_streaming_socket/<string:session_id>')
+def image_streaming_socket(session_id):
+    """
+    Handles the image stream of the given session over a WebSocket. Requires the
+    gevent server and the websocket extra. The optional width, height and quality
+    arguments of the request set the initial size of the frames
+    :param session_id: Id of the session to stream
+    """
+    websocket = request.environ.get('wsgi.websocket')
+    if websocket is None:
+        response = 'Error: WebSocket connection expected'
+        log.error(response)
+        return make_response(response, 400)
+    try:
+        tier = frame_transcoder.parse_tier(request.args)
+        if not tier.is_native and not frame_transcoder.is_available():
+            raise ValueError('Frame transcoding is not available on this server')
+        uri = route_manager.get_route_target(session_id)
+    except (KeyError, ValueError) as e:
+        log.error('Closing WebSocket of session %s: %s', session_id, e)
+        websocket.close()
+        return Response()
+    ticket = admission.admit(session_id, _client_address())
+    if ticket is None:
+        # The connection was already upgraded, so the refusal is reported with the
+        # Try Again Later close code rather than with a 429 response
+        log.error('Too many streams for session %s or client %s', session_id,
+                  _client_address())
+        websocket.close(1013, 'Too many streams, retry after ' +
+                        str(settings.HISS_STREAM_RETRY_AFTER) + ' seconds')
+        return Response()
+    log.info(1, 'Creating WebSocket streamer for %s', session_id)
+    websocket_streamer(websocket, session_id, RestFrameGrabber(uri), tier, ticket)
+    return Response()
+
+
+@application.route('/' + settings.APPLICATION_NAME + '/' + settings.API_VERSION +
+                   '/image_ingestion_feed/<string:session_id>', methods=['POST'])
+def image_ingestion_feed(session_id):
+    """
+    Receives the frames pushed by the rendering resource of the given session,
+    either one image/jpeg frame per request, or a multipart/x-mixed-replace stream
+    whose parts have a Content-Length header. Streams sent with chunked transfer
+    encoding require a server that decodes chunked requests, such as gevent
+    :param session_id: Id of the session
+    """
+    if not route_manager.has_route(session_id):
+        response = 'Error: No route for session ' + session_id
+        log.error(response)
+        return make_response(response, 404)
+    max_size = settings.HISS_PUSH_MAX_FRAME_SIZE
+    if request.mimetype == 'image/jpeg':
+        if request.content_length is None or request.content_length > max_size:
+            response = 'Error: Frames must have a Content-Length of at most ' + \
+                str(max_size) + ' bytes'
+            log.error(response)
+            return make_response(response, 413)
+        broadcasters.push(session_id, request.get_data())
+        return make_response('1 frame(s) received', 200)
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/x-mixed-replace' or not boundary:
+        response = 'Error: Frames must be sent as image/jpeg or ' \
+                   'multipart/x-mixed-replace with a boundary'
+        log.error(response)
+        return make_response(response, 415)
+    # Without Content-Length, the stream is chunked and read as decoded by the server
+    stream = request.stream if request.content_length is not None \
+        else request.environ['wsgi.input']
+    log.info(1, 'Receiving frame stream for session %s', session_id)
+    count = 0
+    try:
+        for frame in frame_ingestion.read_frames(stream, boundary, max_size):
+            broadcasters.push(session_id, frame)
+            count += 1
+    except ValueError as e:
+        response = 'Error: ' + str(e)
+        log.error(response)
+        return make_response(response, 400)
+    return make_response(str(count) + ' frame(s) received', 200)
+
+
 if __name__ == '__main__':
     # Serve requests
-    log.info(1, 'Serving requests on ' + settings.HISS_HOSTNAME +
-             ':' + str(settings.HISS_PORT))
-    application.run(host=settings.HISS_HOSTNAME,
-                    port=settings.HISS_PORT,
-                    debug=settings.HISS_DEBUG,
-                    threaded=settings.HISS_THREADED)
+    import server
+    supervisor.start()
+    server.run(application,
+               host=settings.HISS_HOSTNAME,
+               port=settings.HISS_PORT,
+               debug=settings.HISS_DEBUG)
     log.info(1, 'Closing database')
-    conn.close()
+    route_manager.close()
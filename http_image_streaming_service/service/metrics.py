@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the metrics of the service, exposed in the Prometheus text
+format
+"""
+
+import threading
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# Content type of the exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry = list()
+
+
+def _label_value(value):
+    """
+    Returns a label value as a UTF-8 encoded string, so that unicode session
+    identifiers can be used as labels
+    :param value: Value of the label
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _format_labels(label_names, label_values, extra=''):
+    """
+    Returns the label set of a sample in the exposition format
+    :param label_names: Names of the labels
+    :param label_values: Values of the labels
+    :param extra: Additional, already formatted, label
+    """
+    labels = ['%s="%s"' % (name, _label_value(value).replace('\\', r'\\').replace('"', r'\"')
+                           .replace('\n', r'\n'))
+              for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(labels) + '}'
+
+
+def _format_value(value):
+    """
+    Returns a sample value in the exposition format
+    :param value: Value of the sample
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _CounterValue(object):
+    """
+    Value of a counter for a given label set
+    """
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """
+        Increments the counter
+        :param amount: Amount to add to the counter
+        """
+        with self._lock:
+            self._value += amount
+
+    def samples(self, name, label_names, label_values):
+        """
+        Returns the lines of the value in the exposition format
+        """
+        return [name + _format_labels(label_names, label_values) + ' ' +
+                _format_value(self._value)]
+
+
+class _GaugeValue(_CounterValue):
+    """
+    Value of a gauge for a given label set
+    """
+    def set(self, value):
+        """
+        Sets the gauge to the given value
+        :param value: New value of the gauge
+        """
+        with self._lock:
+            self._value = value
+
+    def dec(self, amount=1):
+        """
+        Decrements the gauge
+        :param amount: Amount to subtract from the gauge
+        """
+        self.inc(-amount)
+
+
+class _HistogramValue(object):
+    """
+    Value of a histogram for a given label set
+    """
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._count = 0
+        self._sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Records an observation
+        :param value: Observed value
+        """
+        with self._lock:
+            self._count += 1
+            self._sum += value
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    def samples(self, name, label_names, label_values):
+        """
+        Returns the lines of the value in the exposition format
+        """
+        with self._lock:
+            counts = list(self._counts)
+            count = self._count
+            total = self._sum
+        lines = list()
+        cumulative = 0
+        for bound, bucket_count in zip(self._buckets, counts):
+            cumulative += bucket_count
+            lines.append(name + '_bucket' +
+                         _format_labels(label_names, label_values,
+                                        'le="' + _format_value(bound) + '"') +
+                         ' ' + _format_value(cumulative))
+        lines.append(name + '_bucket' +
+                     _format_labels(label_names, label_values, 'le="+Inf"') +
+                     ' ' + _format_value(count))
+        lines.append(name + '_count' + _format_labels(label_names, label_values) +
+                     ' ' + _format_value(count))
+        lines.append(name + '_sum' + _format_labels(label_names, label_values) +
+                     ' ' + _format_value(total))
+        return lines
+
+
+class _Metric(object):
+    """
+    Constructor
+    :param name: Name of the metric
+    :param documentation: Description of the metric
+    :param label_names: Names of the labels of the metric
+    """
+    metric_type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self._name = name
+        self._documentation = documentation
+        self._label_names = tuple(label_names)
+        self._values = dict()
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _new_value(self):
+        """
+        Returns a new value of the metric
+        """
+        raise NotImplementedError
+
+    @property
+    def label_names(self):
+        """
+        Returns the names of the labels of the metric
+        """
+        return self._label_names
+
+    def labels(self, *label_values):
+        """
+        Returns the value of the metric for the given label set, creating it if
+        needed
+        :param label_values: Values of the labels, in the order of the label names
+        """
+        key = tuple(_label_value(value) for value in label_values)
+        value = self._values.get(key)
+        if value is None:
+            with self._lock:
+                value = self._values.get(key)
+                if value is None:
+                    value = self._new_value()
+                    self._values[key] = value
+        return value
+
+    def remove(self, **label_filter):
+        """
+        Removes the values of all the label sets matching the given labels
+        :param label_filter: Values of the labels to match, by label name
+        """
+        indices = [(self._label_names.index(name), _label_value(value))
+                   for name, value in label_filter.items()]
+        with self._lock:
+            for key in list(self._values.keys()):
+                if all(key[index] == value for index, value in indices):
+                    del self._values[key]
+
+    def render(self):
+        """
+        Returns the metric in the exposition format
+        """
+        lines = ['# HELP ' + self._name + ' ' + self._documentation,
+                 '# TYPE ' + self._name + ' ' + self.metric_type]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.extend(value.samples(self._name, self._label_names, label_values))
+        return lines
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing value
+    """
+    metric_type = 'counter'
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        """
+        Increments the counter of a metric without labels
+        :param amount: Amount to add to the counter
+        """
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down
+    """
+    metric_type = 'gauge'
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        """
+        Sets the value of a gauge without labels
+        :param value: New value of the gauge
+        """
+        self.labels().set(value)
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values
+    """
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, label_names)
+
+    def _new_value(self):
+        return _HistogramValue(self._buckets)
+
+    def observe(self, value):
+        """
+        Records an observation of a histogram without labels
+        :param value: Observed value
+        """
+        self.labels().observe(value)
+
+
+def remove_session(session_id):
+    """
+    Removes the values of all the metrics labelled with the given session
+    :param session_id: Id of the session
+    """
+    for metric in _registry:
+        if 'session_id' in metric.label_names:
+            metric.remove(session_id=session_id)
+
+
+def render():
+    """
+    Returns all the metrics in the exposition format
+    """
+    lines = list()
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+UPSTREAM_FETCH_SECONDS = Histogram(
+    'hiss_upstream_fetch_seconds',
+    'Time spent fetching a frame from the rendering resource',
+    ['session_id'])
+UPSTREAM_ERRORS = Counter(
+    'hiss_upstream_errors_total',
+    'Number of failed frame requests to rendering resources',
+    ['upstream', 'reason'])
+UPSTREAM_CIRCUIT_OPENINGS = Counter(
+    'hiss_upstream_circuit_openings_total',
+    'Number of times requests to a rendering resource were suspended after failures',
+    ['upstream'])
+FRAMES_PUSHED = Counter(
+    'hiss_frames_pushed_total',
+    'Number of frames pushed by rendering resources',
+    ['session_id'])
+FRAMES_SENT = Counter(
+    'hiss_frames_sent_total',
+    'Number of frames sent to viewers',
+    ['session_id'])
+FRAMES_SUPPRESSED = Counter(
+    'hiss_frames_suppressed_total',
+    'Number of frames not sent to viewers because identical to the previous one',
+    ['session_id'])
+FRAMES_DROPPED = Counter(
+    'hiss_frames_dropped_total',
+    'Number of frames skipped for viewers still busy receiving a previous frame',
+    ['session_id'])
+BYTES_SENT = Counter(
+    'hiss_bytes_sent_total',
+    'Number of bytes sent to viewers',
+    ['session_id'])
+ACTIVE_VIEWERS = Gauge(
+    'hiss_active_viewers',
+    'Number of viewers currently streaming a session',
+    ['session_id'])
+DB_QUERY_SECONDS = Histogram(
+    'hiss_db_query_seconds',
+    'Time spent in route database queries and transactions',
+    ['operation'])
@@ -30,11 +30,68 @@ resources.
 import requests
 import base64
 import json
-import datetime
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.compat import urlparse
 
 import custom_logging as log
+import metrics
+from circuit_breaker import CircuitOpenError, get_circuit_breaker
+
+from settings import HISS_IMAGE_JPEG, HISS_REQUEST_TIMEOUT, HISS_HTTP_POOL_SIZE, \
+    HISS_BINARY_FRAMES, HISS_CONDITIONAL_FRAMES, HISS_UPSTREAM_IDLE_TIMEOUT
+
+# Content types of responses holding the raw JPEG image
+BINARY_CONTENT_TYPES = ('image/jpeg', 'application/octet-stream')
+
+# HTTP sessions shared by all the grabbers targeting the same rendering resource,
+# with the time they were last used
+_sessions = dict()
+_sessions_lock = threading.Lock()
+_next_expiry = [0]
+
+
+def get_session(uri):
+    """
+    Returns the keep-alive HTTP session used to fetch images from the host of the
+    given URI. The session is created on first use, and closed once it was not
+    used for HISS_UPSTREAM_IDLE_TIMEOUT seconds. Callers should therefore get it
+    again for each request
+    :param uri: URI of the rendering resource
+    """
+    parsed_uri = urlparse(uri)
+    key = (parsed_uri.scheme, parsed_uri.netloc)
+    now = time.time()
+    with _sessions_lock:
+        if now >= _next_expiry[0]:
+            _expire_sessions(now)
+        entry = _sessions.get(key)
+        if entry is None:
+            log.info(1, 'Creating HTTP session for %s', parsed_uri.netloc)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HISS_HTTP_POOL_SIZE)
+            session.mount(parsed_uri.scheme + '://', adapter)
+            entry = [session, now]
+            _sessions[key] = entry
+        entry[1] = now
+        return entry[0]
+
 
-from settings import HISS_IMAGE_JPEG, HISS_REQUEST_TIMEOUT, HISS_FRAMES_PER_SECOND
+def _expire_sessions(now):
+    """
+    Closes the HTTP sessions that were not used recently, so that the hosts which
+    are no longer targeted by any route do not keep connections open. Must be
+    called with the lock held
+    :param now: Current time
+    """
+    for key, (session, used_at) in list(_sessions.items()):
+        if now - used_at >= HISS_UPSTREAM_IDLE_TIMEOUT:
+            log.info(1, 'Closing idle HTTP session for %s', key[1])
+            session.close()
+            del _sessions[key]
+    _next_expiry[0] = now + HISS_UPSTREAM_IDLE_TIMEOUT
 
 
 class RestFrameGrabber(object):
@@ -45,26 +102,112 @@ class RestFrameGrabber(object):
     def __init__(self, uri):
         # Contains the default 'not found' image
         self._uri = uri + HISS_IMAGE_JPEG
+        self._upstream = urlparse(self._uri).netloc
+        self._breaker = None
+        self._headers = {'Content-Type': 'application/json'}
+        if HISS_BINARY_FRAMES:
+            # Rendering resources that do not support binary images ignore the
+            # preference and keep on sending base64 encoded JSON documents
+            self._headers['Accept'] = \
+                'image/jpeg, application/octet-stream;q=0.9, application/json;q=0.5'
+        # Validators of the last frame received, sent back to the rendering
+        # resource so that it can answer 304 if the image did not change
+        self._validators = dict()
+
+    def _request_frame(self):
+        """
+        Sends the image request to the rendering resource
+        """
+        headers = self._headers.copy()
+        headers.update(self._validators)
+        session = get_session(self._uri)
+        try:
+            return session.get(
+                url=self._uri, timeout=HISS_REQUEST_TIMEOUT, headers=headers)
+        except requests.exceptions.ConnectionError as e:
+            # The rendering resource may have closed an idle keep-alive connection.
+            # The broken connection is discarded by the pool, so try once more
+            # on a fresh one before giving up
+            log.info(1, 'Reconnecting to %s: %s', self._uri, e)
+            try:
+                return session.get(
+                    url=self._uri, timeout=HISS_REQUEST_TIMEOUT, headers=headers)
+            except requests.exceptions.ConnectionError:
+                metrics.UPSTREAM_ERRORS.labels(self._upstream, 'connection').inc()
+                raise
+
+    def _update_validators(self, response):
+        """
+        Keeps the ETag and Last-Modified headers of the given response for the
+        next conditional request
+        :param response: Response of the rendering resource
+        """
+        validators = dict()
+        if HISS_CONDITIONAL_FRAMES:
+            etag = response.headers.get('ETag')
+            if etag:
+                validators['If-None-Match'] = etag
+            last_modified = response.headers.get('Last-Modified')
+            if last_modified:
+                validators['If-Modified-Since'] = last_modified
+        self._validators = validators
+
+    @staticmethod
+    def _decode_frame(response):
+        """
+        Returns the JPEG image contained in the given response. Binary responses
+        are returned as they are, JSON documents are expected to contain the
+        base64 encoded image in their 'data' field
+        :param response: Response of the rendering resource
+        """
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if content_type in BINARY_CONTENT_TYPES:
+            return response.content
+        json_image_b64 = json.loads(response.content)
+        return base64.decodestring(json_image_b64['data'])
 
     def get_frame(self):
         """
-        Returns the current image generated by the remote rendering resource
+        Returns the current image generated by the remote rendering resource, or
+        None if no new image is available. The frame rate is controlled by the
+        caller
+        :raise CircuitOpenError: If requests to the rendering resource are suspended
+                                 after repeated failures
         """
+        # The circuit breaker is fetched again so that it is not discarded as idle
+        self._breaker = get_circuit_breaker(self._uri)
+        if not self._breaker.allow():
+            raise CircuitOpenError(self._uri)
+        succeeded = False
         try:
-            start = datetime.datetime.now()
-            response = requests.get(
-                url=self._uri, timeout=HISS_REQUEST_TIMEOUT,
-                headers={'Content-Type': 'application/json'})
-            duration = datetime.datetime.now() - start
-            delay = 1e6 / float(HISS_FRAMES_PER_SECOND) - duration.microseconds
-            if delay > 0:
-                import time
-                time.sleep(delay / 1e6)
+            response = self._request_frame()
             status = response.status_code
             response.close()
             if status == 200:
-                json_image_b64 = json.loads(response.content)
-                return base64.decodestring(json_image_b64['data'])
+                self._update_validators(response)
+                frame = self._decode_frame(response)
+                succeeded = True
+                return frame
+            if status == 304:
+                succeeded = True
+                log.debug(1, 'Frame not modified for %s', self._uri)
+            else:
+                metrics.UPSTREAM_ERRORS.labels(self._upstream, 'status_' + str(status)).inc()
         except requests.exceptions.ReadTimeout as e:
-            log.error('Connection error: ' + str(e))
+            metrics.UPSTREAM_ERRORS.labels(self._upstream, 'timeout').inc()
+            log.error('Connection error: %s', e)
+        finally:
+            self._record_outcome(succeeded)
         return None
+
+    def _record_outcome(self, succeeded):
+        """
+        Records the outcome of a request in the circuit breaker of the rendering
+        resource
+        :param succeeded: True if the rendering resource answered with an image
+        """
+        if succeeded:
+            self._breaker.record_success()
+        elif self._breaker.record_failure():
+            metrics.UPSTREAM_CIRCUIT_OPENINGS.labels(self._upstream).inc()
+            log.error('Suspending requests to %s after repeated failures', self._uri)
@@ -28,9 +28,12 @@ This module contains the class in charge of managing the routes
 # pylint: disable=W0403
 from flask import make_response
 import json
+import threading
+import time
 import custom_logging as log
+import metrics
 import settings
-import sqlite3
+from route_store import RouteStore
 
 
 class RouteManager(object):
@@ -39,108 +42,204 @@ class RouteManager(object):
     Constructor
     """
     def __init__(self):
-        self._frame_md5s = dict()
+        self._store = RouteStore(settings.HISS_DB)
+        self._routes = dict()
+        self._routes_version = None
+        self._routes_checked = 0
+        self._routes_lock = threading.Lock()
         log.info(1, 'Route manager initialized')
 
+    def _cached_routes(self):
+        """
+        Returns the in-process copy of the routes table. The copy is reloaded from
+        the database when the routes version counter has been changed by this or
+        by another process. The counter is checked at most once every
+        HISS_ROUTE_CACHE_TTL seconds
+        """
+        with self._routes_lock:
+            now = time.time()
+            if self._routes_version is not None and \
+                    now - self._routes_checked < settings.HISS_ROUTE_CACHE_TTL:
+                return self._routes
+            version = self._store.query('select version from routes_version')[0][0]
+            if version != self._routes_version:
+                self._routes = dict(
+                    (session_id, (uri, fps)) for session_id, uri, fps in
+                    self._store.query('select session_id, uri, fps from routes'))
+                self._routes_version = version
+                log.debug(1, 'Routes reloaded (version %s)', version)
+            self._routes_checked = now
+            return self._routes
+
+    def _invalidate_routes(self):
+        """
+        Forces the routes to be reloaded from the database on next access
+        """
+        with self._routes_lock:
+            self._routes_version = None
+
     @staticmethod
-    def get_route(session_id):
+    def _bump_routes_version(cur):
+        """
+        Increments the routes version counter so that all processes sharing the
+        database reload their cached routes
+        :param cur: Cursor of the transaction that modified the routes
+        """
+        cur.execute('update routes_version set version = version + 1')
+
+    def has_route(self, session_id):
+        """
+        Returns True if a route exists for the given session. Only the cached
+        routes are read, so that the existence of a route can be checked for
+        every frame
+        :param session_id: Id of the session
+        """
+        return session_id == 'demo' or session_id in self._cached_routes()
+
+    def get_route(self, session_id):
         """
         Returns a JSON formatted list of active routes
         """
         # Check for the existence of the route. Raise a KeyError exception
         # if not found
-        # pylint: disable=W0104
-        if session_id != 'demo':
-            conn = sqlite3.connect(settings.HISS_DB)
-            try:
-                cur = conn.cursor()
-                cur.execute('select uri from routes where session_id=?', (session_id,))
-                rows = cur.fetchall()
-                if len(rows) == 0:
-                    raise KeyError
-            finally:
-                conn.close()
+        if not self.has_route(session_id):
+            raise KeyError
 
         response = json.dumps(
             {'uri': settings.HISS_URL +
                 '/image_streaming_feed/' +
                 str(session_id)})
-        log.info(1, 'Route for ' + str(session_id) + ' is ' + str(response))
+        log.info(1, 'Route for %s is %s', session_id, response)
         return response
 
-    @staticmethod
-    def get_route_target(session_id):
+    def get_route_target(self, session_id):
         """
         Returns a JSON formatted list of active routes
         """
-        log.info(1, 'Route target for session ' + session_id + ' is...')
-        conn = sqlite3.connect(settings.HISS_DB)
-        try:
-            cur = conn.cursor()
-            cur.execute('select uri from routes where session_id=?', (session_id,))
-            rows = cur.fetchall()
-            response = rows[0][0]
-        finally:
-            conn.close()
-        log.info(1, 'Route target for session ' + session_id + ' is ' + str(response))
+        response = self._cached_routes()[session_id][0]
+        log.info(1, 'Route target for session %s is %s', session_id, response)
         return response
 
-    def get_frame_md5(self, session_id):
+    def get_route_fps(self, session_id):
         """
-        Returns the latest frame md5 for the given session
+        Returns the number of frames per second at which the given session is
+        streamed
         :param session_id: Id of the session for which the route was created
         """
-        response = None
-        try:
-            response = self._frame_md5s[session_id]
-            log.debug(1, 'Hashed frame for ' + session_id + ' is ' + str(response))
-        except KeyError:
-            log.debug(1, 'No hashed frame for ' + session_id)
-        return response
+        route = self._cached_routes().get(session_id)
+        if route is None or route[1] is None:
+            return settings.HISS_FRAMES_PER_SECOND
+        return route[1]
 
-    def set_frame_md5(self, session_id, md5):
+    def list_routes(self, health=False):
         """
-        Sets the latest frame md5 for the given session
-        :param session_id: Id of the session for which the route was created
-        :param md5: MD5 of the frame
+        Returns a JSON formatted list of active routes
+        :param health: True to add the result of the latest liveness probe to
+                       each route
         """
-        self._frame_md5s[session_id] = md5
+        log.info(1, 'Getting all routes')
+        return json.dumps(list(self.iter_routes(health=health)))
 
-    @staticmethod
-    def list_routes():
+    def iter_routes(self, prefix=None, after=None, limit=None, health=False):
         """
-        Returns a JSON formatted list of active routes
+        Returns the routes ordered by session id. The routes are read from the
+        database one page at a time, so that the memory used does not depend on
+        the number of routes
+        :param prefix: Only returns the routes whose session id starts with the
+                       given prefix
+        :param after: Only returns the routes whose session id follows the given one
+        :param limit: Maximum number of routes returned, None for all of them
+        :param health: True to add the result of the latest liveness probe to
+                       each route
+        :return: A generator of [session_id, uri] lists, with an additional
+                 dictionary holding the health of the route if requested
         """
-        log.info(1, 'Getting all routes')
-        routes = dict()
-        conn = sqlite3.connect(settings.HISS_DB)
-        try:
-            cur = conn.cursor()
-            cur.execute('select session_id, uri from routes')
-            rows = cur.fetchall()
+        columns = 'session_id, uri, health, latency, failures, checked' if health \
+            else 'session_id, uri'
+        conditions = list()
+        parameters = list()
+        if prefix:
+            # Range condition, so that the primary key index is used
+            conditions.append('session_id >= ?')
+            parameters.append(prefix)
+            last = ord(prefix[-1])
+            if last < 0xd800 or 0xdfff < last < 0xffff:
+                conditions.append('session_id < ?')
+                parameters.append(prefix[:-1] + unichr(last + 1))
+            # Otherwise the last character cannot be incremented, as it is a
+            # surrogate or the last code point of the build, and the routes are
+            # read until a session id does not start with the prefix
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = settings.HISS_ROUTES_PAGE_SIZE if remaining is None \
+                else min(settings.HISS_ROUTES_PAGE_SIZE, remaining)
+            page_conditions = conditions + ['session_id > ?'] if after is not None \
+                else conditions
+            page_parameters = parameters + [after] if after is not None else parameters
+            sql = 'select ' + columns + ' from routes'
+            if page_conditions:
+                sql += ' where ' + ' and '.join(page_conditions)
+            rows = self._store.query(sql + ' order by session_id limit ?',
+                                     page_parameters + [page_size])
             for row in rows:
-                routes[row[0]] = row[1]
-        finally:
-            conn.close()
-        response = json.dumps(routes.items())
-        log.info(1, response)
-        return make_response(response, 200)
+                if prefix and not row[0].startswith(prefix):
+                    return
+                if health:
+                    yield [row[0], row[1], {'health': row[2], 'latency': row[3],
+                                            'failures': row[4], 'checked': row[5]}]
+                else:
+                    yield [row[0], row[1]]
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
 
-    @staticmethod
-    def create_route(session_id, uri):
+    def list_route_targets(self):
+        """
+        Returns the routes with the time of their latest liveness probe
+        :return: A list of (session_id, uri, checked) tuples. checked is None for
+                 routes that were never probed
+        """
+        return self._store.query('select session_id, uri, checked from routes')
+
+    def record_route_health(self, session_id, uri, healthy, latency):
+        """
+        Records the result of a liveness probe of the rendering resource of a route.
+        Routes modified since the probe started are left unchanged
+        :param session_id: Id of the session for which the route was created
+        :param uri: URI of the route when the probe started
+        :param healthy: True if the rendering resource answered the probe
+        :param latency: Number of seconds taken by the probe
+        :return: The number of consecutive failed probes of the route
+        """
+        with self._store.transaction() as cur:
+            # The routes version is not changed, as the cached routes do not hold
+            # their health
+            cur.execute('update routes set health=?, latency=?, checked=?, '
+                        'failures=case when ? then 0 else failures + 1 end '
+                        'where session_id=? and uri=?',
+                        ('healthy' if healthy else 'unhealthy', latency, time.time(),
+                         healthy, session_id, uri))
+            cur.execute('select failures from routes where session_id=? and uri=?',
+                        (session_id, uri))
+            row = cur.fetchone()
+        return row[0] if row is not None else 0
+
+    def create_route(self, session_id, uri, fps=None):
         """
         Adds a new route. If the route already exists for the given session, the
         current URI is replaced by the new one
         :param session_id: Id of the session for which the route was created
         :param uri: URI of new route
+        :param fps: Number of frames per second of the session stream. None for
+                    HISS_FRAMES_PER_SECOND
         """
-        conn = sqlite3.connect(settings.HISS_DB)
-        try:
-            cur = conn.cursor()
-            cur.execute('insert into routes (session_id, uri) values(?, ?)', (session_id, uri))
-            conn.commit()
-        finally:
-            conn.close()
+        with self._store.transaction() as cur:
+            cur.execute('insert or replace into routes (session_id, uri, fps) values(?, ?, ?)',
+                        (session_id, uri, fps))
+            self._bump_routes_version(cur)
+        self._invalidate_routes()
 
         # self.routes[session_id] = uri
         msg = 'Route ' + uri + ' successfully added'
@@ -148,39 +247,76 @@ class RouteManager(object):
         response = json.dumps({'contents': msg})
         return make_response(response, 201)
 
-    @staticmethod
-    def delete_route(session_id):
+    def create_routes(self, routes):
+        """
+        Adds or replaces several routes in a single transaction
+        :param routes: List of (session_id, uri, fps) tuples. fps may be None for
+                       HISS_FRAMES_PER_SECOND
+        """
+        with self._store.transaction() as cur:
+            cur.executemany('insert or replace into routes (session_id, uri, fps) '
+                            'values(?, ?, ?)', routes)
+            self._bump_routes_version(cur)
+        self._invalidate_routes()
+        log.info(1, '%d route(s) successfully added', len(routes))
+
+    def delete_routes(self, session_ids):
+        """
+        Removes several routes in a single transaction
+        :param session_ids: Ids of the sessions whose routes are removed
+        :return: The set of the ids of the sessions that had a route
+        """
+        existing = set()
+        with self._store.transaction() as cur:
+            # SQLite limits the number of parameters of a statement
+            for start in range(0, len(session_ids), 500):
+                batch = session_ids[start:start + 500]
+                cur.execute('select session_id from routes where session_id in (' +
+                            ','.join('?' * len(batch)) + ')', batch)
+                existing.update(row[0] for row in cur.fetchall())
+            cur.executemany('delete from routes where session_id=?',
+                            [(session_id,) for session_id in session_ids])
+            self._bump_routes_version(cur)
+        self._invalidate_routes()
+        for session_id in existing:
+            metrics.remove_session(session_id)
+        log.info(1, '%d route(s) successfully removed', len(existing))
+        return existing
+
+    def delete_route(self, session_id):
         """
         Removes an existing route
         :param session_id: Id of the session for which the route was created
         """
-        log.info(1, 'Removing route for session ' + str(session_id))
-        conn = sqlite3.connect(settings.HISS_DB)
-        try:
-            cur = conn.cursor()
+        log.info(1, 'Removing route for session %s', session_id)
+        with self._store.transaction() as cur:
             cur.execute('delete from routes where session_id=?', (session_id,))
-            conn.commit()
-            msg = 'Route ' + session_id + ' successfully removed'
-            response = json.dumps({'contents': msg})
-            log.info(1, response)
-            return make_response(response, 200)
-        except KeyError:
-            response = json.dumps({'contents': 'Route does not exist'})
-            log.info(1, response)
-            return make_response(response, 404)
-        finally:
-            conn.close()
+            self._bump_routes_version(cur)
+        self._invalidate_routes()
+        # The metrics of sessions that were never viewed, such as pushed sessions,
+        # are not removed with a broadcaster
+        metrics.remove_session(session_id)
+        msg = 'Route ' + session_id + ' successfully removed'
+        response = json.dumps({'contents': msg})
+        log.info(1, response)
+        return make_response(response, 200)
 
-    @staticmethod
-    def clear_routes():
+    def clear_routes(self):
         """
         Removes all existing routes
         """
-        conn = sqlite3.connect(settings.HISS_DB)
-        try:
-            cur = conn.cursor()
+        with self._store.transaction() as cur:
+            cur.execute('select session_id from routes')
+            session_ids = [row[0] for row in cur.fetchall()]
             cur.execute('delete from routes')
-            conn.commit()
-        finally:
-            conn.close()
+            self._bump_routes_version(cur)
+        self._invalidate_routes()
+        for session_id in session_ids:
+            metrics.remove_session(session_id)
         return [200, 'Routes cleared']
+
+    def close(self):
+        """
+        Closes the database connection of the calling thread
+        """
+        self._store.close()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the class in charge of the SQLite database in which the
+routes are stored
+"""
+
+# pylint: disable=W0403
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+
+import custom_logging as log
+import metrics
+import settings
+
+# Version of the database schema, stored in the user_version pragma
+SCHEMA_VERSION = 4
+
+
+class RouteStore(object):
+    """
+    Constructor
+    :param db_path: Path of the SQLite database file
+    """
+    def __init__(self, db_path):
+        self._db_path = db_path
+        self._local = threading.local()
+        self.migrate()
+
+    def connection(self):
+        """
+        Returns the connection of the calling thread, opening it on first use. The
+        connection is released when the thread terminates
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _connect(self, isolation_level=''):
+        """
+        Opens a new connection to the database
+        :param isolation_level: Isolation level of the connection. None for autocommit
+        """
+        conn = sqlite3.connect(self._db_path, timeout=settings.HISS_DB_TIMEOUT,
+                               isolation_level=isolation_level)
+        conn.execute('pragma journal_mode=wal')
+        conn.execute('pragma synchronous=' + settings.HISS_DB_SYNCHRONOUS)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Provides a cursor whose changes are committed on success and rolled back
+        if an exception is raised
+        """
+        conn = self.connection()
+        cur = conn.cursor()
+        start = time.time()
+        try:
+            yield cur
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            metrics.DB_QUERY_SECONDS.labels('transaction').observe(time.time() - start)
+
+    def query(self, sql, parameters=()):
+        """
+        Executes a read-only statement and returns all resulting rows
+        :param sql: SQL statement
+        :param parameters: Parameters of the statement
+        """
+        cur = self.connection().cursor()
+        start = time.time()
+        try:
+            cur.execute(sql, parameters)
+            return cur.fetchall()
+        finally:
+            cur.close()
+            metrics.DB_QUERY_SECONDS.labels('query').observe(time.time() - start)
+
+    def migrate(self):
+        """
+        Creates the database schema, or upgrades the schema of an existing
+        database to the current version
+        """
+        # The migration runs in an explicit transaction so that concurrent worker
+        # processes do not migrate the same database twice
+        conn = self._connect(isolation_level=None)
+        try:
+            cur = conn.cursor()
+            cur.execute('begin immediate')
+            try:
+                self._migrate(cur)
+                cur.execute('commit')
+            except:
+                cur.execute('rollback')
+                raise
+        finally:
+            conn.close()
+
+    def _migrate(self, cur):
+        """
+        Upgrades the schema within the transaction of the given cursor
+        :param cur: Cursor of the migration transaction
+        """
+        cur.execute('pragma user_version')
+        version = cur.fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        if version < 2:
+            self._create_routes_table(cur)
+        if version < 3:
+            # Per-session frame rate. NULL means HISS_FRAMES_PER_SECOND
+            cur.execute('alter table routes add column fps real')
+        if version < 4:
+            # Result of the latest liveness probe of the rendering resource
+            cur.execute('alter table routes add column health text')
+            cur.execute('alter table routes add column latency real')
+            cur.execute('alter table routes add column failures integer not null default 0')
+            cur.execute('alter table routes add column checked real')
+        cur.execute('update routes_version set version = version + 1')
+        cur.execute('pragma user_version=' + str(SCHEMA_VERSION))
+
+    def _create_routes_table(self, cur):
+        """
+        Creates the routes table with a unique session id, migrating the routes of
+        databases created before the schema was versioned
+        :param cur: Cursor of the migration transaction
+        """
+        cur.execute("select name from sqlite_master where type='table'")
+        tables = [row[0] for row in cur.fetchall()]
+        if 'routes' in tables:
+            # Databases created before the schema was versioned allowed several
+            # routes per session. Only the most recent one is kept
+            log.info(1, 'Migrating routes table of %s', self._db_path)
+            cur.execute('alter table routes rename to routes_v1')
+            cur.execute('create table routes (session_id text primary key, uri text)')
+            cur.execute('insert into routes (session_id, uri) '
+                        'select session_id, uri from routes_v1 where rowid in '
+                        '(select max(rowid) from routes_v1 group by session_id)')
+            cur.execute('drop table routes_v1')
+        else:
+            cur.execute('create table routes (session_id text primary key, uri text)')
+        if 'routes_version' not in tables:
+            cur.execute('create table routes_version (version integer)')
+            cur.execute('insert into routes_version (version) values (0)')
+
+    def close(self):
+        """
+        Closes the connection of the calling thread
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the class in charge of probing the rendering resources of
+the routes, so that dead rendering resources are detected without waiting for a
+viewer to time out on them
+"""
+
+# pylint: disable=W0403
+import threading
+import time
+import requests
+
+import custom_logging as log
+import settings
+from rest_frame_grabber import get_session
+
+
+class RouteSupervisor(object):
+    """
+    Constructor
+    :param route_manager: Route manager holding the routes to probe
+    :param application: Flask application providing the context of the probes
+    :param interval: Number of seconds between two probes of a route
+    :param concurrency: Maximum number of rendering resources probed at the same time
+    :param timeout: Number of seconds after which a probe fails
+    :param max_failures: Number of consecutive failed probes after which a route
+                         is removed
+    """
+    def __init__(self, route_manager, application,
+                 interval=settings.HISS_HEALTH_CHECK_INTERVAL,
+                 concurrency=settings.HISS_HEALTH_CHECK_CONCURRENCY,
+                 timeout=settings.HISS_HEALTH_CHECK_TIMEOUT,
+                 max_failures=settings.HISS_HEALTH_CHECK_MAX_FAILURES):
+        self._route_manager = route_manager
+        self._application = application
+        self._interval = interval
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._max_failures = max_failures
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts probing the routes in the background, unless the probes are disabled
+        """
+        if self._interval <= 0 or self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='route-supervisor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops probing the routes
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """
+        Probes the routes until stopped
+        """
+        log.info(1, 'Probing routes every %s seconds', self._interval)
+        with self._application.app_context():
+            while not self._stopped.is_set():
+                try:
+                    self.check_routes()
+                except Exception as e:  # pylint: disable=W0703
+                    log.error('Failed to probe routes: %s', e)
+                self._stopped.wait(self._interval)
+        self._route_manager.close()
+
+    def check_routes(self):
+        """
+        Probes the rendering resources of the routes, records their health, and
+        removes the routes that failed too many consecutive probes. Routes
+        recently probed by another process sharing the database are skipped
+        """
+        now = time.time()
+        routes = [(session_id, uri) for session_id, uri, checked in
+                  self._route_manager.list_route_targets()
+                  if checked is None or now - checked >= self._interval / 2.0]
+        if not routes:
+            return
+        results = self._probe_all(routes)
+        for (session_id, uri), (healthy, latency) in zip(routes, results):
+            failures = self._route_manager.record_route_health(
+                session_id, uri, healthy, latency)
+            if failures >= self._max_failures:
+                log.error('Rendering resource %s failed %d consecutive probes. '
+                          'Removing route for session %s', uri, failures, session_id)
+                self._route_manager.delete_route(session_id)
+
+    def _probe_all(self, routes):
+        """
+        Probes the rendering resources of the given routes concurrently
+        :param routes: List of (session_id, uri) tuples
+        :return: The list of (healthy, latency) results, in the order of the routes
+        """
+        results = [None] * len(routes)
+        pending = list(range(len(routes)))
+        lock = threading.Lock()
+
+        def probe_pending():
+            """
+            Probes routes until all of them are probed
+            """
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    index = pending.pop()
+                results[index] = self._probe(routes[index][1])
+
+        threads = [threading.Thread(target=probe_pending, name='route-probe')
+                   for _ in range(min(self._concurrency, len(routes)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _probe(self, uri):
+        """
+        Checks that the rendering resource at the given URI answers HTTP requests.
+        Any response, whatever its status, means that the resource is alive
+        :param uri: URI of the rendering resource
+        :return: A (healthy, latency) tuple
+        """
+        start = time.time()
+        try:
+            get_session(uri).head(uri, timeout=self._timeout, allow_redirects=False)
+            healthy = True
+        except requests.exceptions.RequestException as e:
+            log.info(1, 'Probe of %s failed: %s', uri, e)
+            healthy = False
+        return healthy, time.time() - start
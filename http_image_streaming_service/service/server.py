@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the function in charge of serving the application with the
+server selected in the settings
+"""
+
+# pylint: disable=W0403
+import custom_logging as log
+import settings
+
+# Serving modes
+THREADED_SERVER = 'threaded'
+GEVENT_SERVER = 'gevent'
+
+
+def patch():
+    """
+    Makes sockets, sleeps and threads cooperative when the gevent server is
+    selected. Must be called before the service modules are imported
+    """
+    if settings.HISS_SERVER == GEVENT_SERVER:
+        from gevent import monkey
+        monkey.patch_all()
+
+
+def run(application, host, port, debug=False):
+    """
+    Serves the given application until interrupted. With the gevent server, every
+    viewer stream and every session broadcaster runs in a greenlet instead of
+    an OS thread, so that a single process can hold thousands of connections.
+    The gevent server only starts if patch was called before the service modules
+    were imported, as in app.py: otherwise the blocking waits of the viewers and
+    of the broadcasters would stall all the greenlets. WebSocket streams are only
+    served by the gevent server
+    :param application: WSGI application to serve
+    :param host: Host name on which requests are served
+    :param port: Port on which requests are served
+    :param debug: Enables the Flask debugger. Ignored by the gevent server
+    :raise RuntimeError: If the gevent server is selected but patch was not called
+    """
+    log.info(1, 'Serving requests on %s:%s with %s server', host, port, settings.HISS_SERVER)
+    if settings.HISS_SERVER == GEVENT_SERVER:
+        from gevent import monkey
+        if not monkey.is_module_patched('threading'):
+            raise RuntimeError('The gevent server requires server.patch() to be called '
+                               'before the service is imported, use app.py')
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+        options = dict()
+        try:
+            from geventwebsocket.handler import WebSocketHandler
+            options['handler_class'] = WebSocketHandler
+        except ImportError:
+            log.info(1, 'WebSocket streams require the websocket extra')
+        server = WSGIServer((host, port), application,
+                            spawn=Pool(settings.HISS_GEVENT_MAX_CONNECTIONS), log=None,
+                            **options)
+        server.serve_forever()
+    elif settings.HISS_SERVER == THREADED_SERVER:
+        application.run(host=host, port=port, debug=debug, threaded=settings.HISS_THREADED)
+    else:
+        raise ValueError('Unknown server ' + settings.HISS_SERVER)
@@ -39,20 +39,175 @@ HISS_URL = 'http://' + HISS_HOSTNAME + ':' + str(HISS_PORT) + \
            '/' + APPLICATION_NAME + '/' + API_VERSION
 HISS_DEBUG = True
 HISS_THREADED = True
+
+# Server used to serve the requests: 'threaded' for the Flask server, 'gevent'
+# for the gevent server (requires the gevent extra)
+HISS_SERVER = os.environ.get('HISS_SERVER', 'threaded')
+
+# Maximum number of concurrent connections handled by the gevent server
+HISS_GEVENT_MAX_CONNECTIONS = 10000
 HISS_DB = os.environ.get('HISS_DB', '/tmp') + '/hiss.db'
 
+# Number of seconds a database connection waits for a lock before failing
+HISS_DB_TIMEOUT = 5
+
+# SQLite synchronous mode. NORMAL is safe with write-ahead logging and avoids
+# an fsync on every route change
+HISS_DB_SYNCHRONOUS = 'NORMAL'
+
+# Transport sharing the frames of a session between the worker processes, so that
+# only one of them polls the rendering resource: None for single-process
+# deployments, 'shm' for the workers of a node, 'local' for tests, or the dotted
+# path of a FrameBus class
+HISS_FRAME_BUS = os.environ.get('HISS_FRAME_BUS')
+
+# Shared directory used by the 'shm' frame bus
+HISS_FRAME_BUS_DIR = os.environ.get(
+    'HISS_FRAME_BUS_DIR', '/dev/shm/hiss' if os.path.isdir('/dev/shm') else '/tmp/hiss')
+
+# Number of bytes of the ring buffer holding the frames of a session in the shared
+# directory. Must be larger than the largest frame
+HISS_FRAME_RING_SIZE = 16 * 1024 * 1024
+
+# Maximum number of seconds during which the routes cached by a process may
+# ignore changes made to the database by other processes
+HISS_ROUTE_CACHE_TTL = 1
+
 # If True, a frame is push to the end-client only if different from the previous one
-HISS_STREAMING_OPTIMIZATION = False
+HISS_STREAMING_OPTIMIZATION = True
 
 # Image URI for frame grabber
 HISS_IMAGE_JPEG = '/v1/image-jpeg'
 
+# If True, rendering resources are asked for raw JPEG images rather than base64
+# encoded JSON documents. Resources that only support JSON are still handled
+HISS_BINARY_FRAMES = True
+
+# If True, frames are requested with the ETag and Last-Modified validators of the
+# previous frame, and 304 answers are treated as 'no new frame'
+HISS_CONDITIONAL_FRAMES = True
+
 # Request timeout for frame grabbing
 HISS_REQUEST_TIMEOUT = 10
 
+# Number of consecutive failed requests to a rendering resource after which no
+# request is sent to it until a backoff delay has elapsed
+HISS_CIRCUIT_FAILURE_THRESHOLD = 5
+
+# Number of seconds without requests after the circuit of a rendering resource
+# opened for the first time. The delay doubles each time the circuit opens again
+HISS_CIRCUIT_BACKOFF = 1
+
+# Maximum number of seconds without requests to a failing rendering resource
+HISS_CIRCUIT_MAX_BACKOFF = 60
+
+# Number of routes read from the database at once when listing routes. Also the
+# maximum number of routes of a page of the route listing
+HISS_ROUTES_PAGE_SIZE = 500
+
+# Maximum number of routes created or removed by a single bulk request
+HISS_BULK_MAX_ROUTES = 10000
+
+# Number of seconds between two liveness probes of the rendering resource of a
+# route. 0 disables the probes
+HISS_HEALTH_CHECK_INTERVAL = 10
+
+# Maximum number of rendering resources probed at the same time
+HISS_HEALTH_CHECK_CONCURRENCY = 10
+
+# Number of seconds after which a liveness probe fails
+HISS_HEALTH_CHECK_TIMEOUT = 2
+
+# Number of consecutive failed probes after which a route is removed
+HISS_HEALTH_CHECK_MAX_FAILURES = 3
+
+# Maximum number of keep-alive connections kept open to each rendering resource
+HISS_HTTP_POOL_SIZE = 10
+
+# Number of seconds after which the HTTP session and the circuit breaker of a
+# rendering resource that received no request are discarded. Must be longer
+# than HISS_CIRCUIT_MAX_BACKOFF and HISS_REQUEST_TIMEOUT
+HISS_UPSTREAM_IDLE_TIMEOUT = 300
+
 # Number of frames par seconds to be sent to the end-client
 HISS_FRAMES_PER_SECOND = 5
 
+# Maximum number of frames per second of a route or of a viewer
+HISS_MAX_FRAMES_PER_SECOND = 120
+
+# Maximum number of seconds a viewer waits for a new frame before checking that
+# the session broadcast is still alive
+HISS_SUBSCRIBER_TIMEOUT = 1
+
+# Number of seconds after the last frame pushed by a rendering resource during
+# which its session is not polled
+HISS_PUSH_TIMEOUT = 5
+
+# Number of seconds during which a frame fetched for a snapshot is served without
+# fetching a new one. Also the max-age of the snapshots
+HISS_SNAPSHOT_TTL = 2
+
+# Maximum number of bytes of a frame pushed by a rendering resource
+HISS_PUSH_MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# Maximum number of streams of a session, 0 for no limit
+HISS_MAX_VIEWERS_PER_SESSION = int(os.environ.get('HISS_MAX_VIEWERS_PER_SESSION', 100))
+
+# Maximum number of streams opened by a client address, 0 for no limit. Pages
+# such as thumbnail galleries open many streams from a single client
+HISS_MAX_STREAMS_PER_CLIENT = int(os.environ.get('HISS_MAX_STREAMS_PER_CLIENT', 0))
+
+# Comma-separated addresses of the reverse proxies whose X-Forwarded-For header
+# identifies the client of a stream
+HISS_TRUSTED_PROXIES = [address.strip() for address in
+                        os.environ.get('HISS_TRUSTED_PROXIES', '').split(',')
+                        if address.strip()]
+
+# Number of seconds after which a client refused a stream may try again
+HISS_STREAM_RETRY_AFTER = 5
+
+# Number of seconds without successful write after which a stream is reaped, 0
+# to never reap streams. The last frame is sent again to the viewers of sessions
+# that did not change for half that time
+HISS_STREAM_IDLE_TIMEOUT = 30
+
+# Folder of the session recordings
+HISS_RECORDING_DIR = os.environ.get('HISS_RECORDING_DIR', '/tmp/hiss_recordings')
+
+# Maximum speed factor of the replay of a recording
+HISS_REPLAY_MAX_SPEED = 100
+
+# Maximum number of seconds between two frames of a replay. Longer pauses of the
+# recording, such as periods without viewers, are shortened
+HISS_REPLAY_MAX_GAP = 1
+
+# Maximum number of frames sent to a WebSocket viewer and not acknowledged yet,
+# once the viewer acknowledges frames
+HISS_WEBSOCKET_WINDOW = 2
+
+# Maximum width and height accepted for frames resized for a viewer
+HISS_TRANSCODING_MAX_SIZE = 8192
+
+# If True, the JPEG quality of the frames sent to a viewer is lowered while the
+# viewer cannot keep up with the frame rate of its stream. Requires the
+# transcoding extra
+HISS_ADAPTIVE_QUALITY = True
+
+# Successive JPEG qualities used for viewers that fall behind
+HISS_ADAPTIVE_QUALITY_LEVELS = (60, 40, 25)
+
+# Number of consecutive late frames after which the quality is lowered
+HISS_SLOW_VIEWER_FRAMES = 3
+
+# Number of consecutive frames sent in time after which the quality is raised
+HISS_FAST_VIEWER_FRAMES = 25
+
+# Level of the messages logged by the service (DEBUG, INFO, ERROR...)
+HISS_LOG_LEVEL = os.environ.get('HISS_LOG_LEVEL', 'ERROR')
+
+# Format of the log records: 'text', or 'json' for one JSON document per line
+HISS_LOG_FORMAT = os.environ.get('HISS_LOG_FORMAT', 'text')
+
 # ID of cookie containing the session ID. The session ID is used to identify
 # the route that should be used to fetch images
 HBP_COOKIE = 'HBP'
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the cache of the latest frames of the sessions, served as
+snapshots without opening a stream
+"""
+
+# pylint: disable=W0403
+import threading
+import time
+
+from settings import HISS_SNAPSHOT_TTL
+
+
+class _Snapshot(object):
+    """
+    Latest frame fetched for a session
+    """
+    def __init__(self):
+        self.frame = None
+        self.fetched = 0
+        self.lock = threading.Lock()
+
+
+class SnapshotCache(object):
+    """
+    Constructor
+    :param broadcasters: Registry of the session broadcasters, whose frames are
+                         served when available
+    :param ttl: Number of seconds during which a fetched frame is served
+    """
+    def __init__(self, broadcasters, ttl=HISS_SNAPSHOT_TTL):
+        self._broadcasters = broadcasters
+        self._ttl = ttl
+        self._snapshots = dict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, create_frame_grabber):
+        """
+        Returns the latest frame of the given session: the frame currently
+        broadcast or pushed if any, otherwise a frame fetched from the rendering
+        resource less than ttl seconds ago. Concurrent requests for the same
+        session share a single fetch
+        :param session_id: Id of the session
+        :param create_frame_grabber: Function returning the frame grabber used if
+                                     the frame has to be fetched
+        :return: The frame, or None if the rendering resource has no new image
+        """
+        frame = self._broadcasters.latest_frame(session_id)
+        if frame is not None:
+            return frame
+        snapshot = self._snapshot(session_id)
+        with snapshot.lock:
+            if snapshot.frame is None or time.time() - snapshot.fetched >= self._ttl:
+                snapshot.frame = create_frame_grabber().get_frame()
+                snapshot.fetched = time.time()
+            return snapshot.frame
+
+    def _snapshot(self, session_id):
+        """
+        Returns the cache entry of the given session, creating it if needed.
+        Expired entries of the other sessions are discarded
+        :param session_id: Id of the session
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(session_id)
+            if snapshot is None:
+                now = time.time()
+                for other_id, other in list(self._snapshots.items()):
+                    if now - other.fetched >= self._ttl and not other.lock.locked():
+                        del self._snapshots[other_id]
+                snapshot = _Snapshot()
+                self._snapshots[session_id] = snapshot
+            return snapshot
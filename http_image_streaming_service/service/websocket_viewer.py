@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+"""
+This module contains the protocol of the WebSocket streams. The service sends
+each frame in a binary message made of a header, holding the sequence number of
+the frame and the time at which it was sent, followed by the JPEG image. Viewers
+send JSON text messages to change the frame rate and size of their stream, and
+to acknowledge the frames they displayed:
+
+    {"fps": 10}
+    {"width": 320, "height": 240, "quality": 50}
+    {"ack": 42}
+
+Once a viewer acknowledged a frame, the service stops sending frames whenever
+HISS_WEBSOCKET_WINDOW frames are not acknowledged, so that the viewer throttles
+the stream to the rate at which it can display the frames
+"""
+
+from collections import deque
+import json
+import struct
+import threading
+import time
+
+from frame_clock import is_valid_fps
+import frame_transcoder
+from settings import HISS_MAX_FRAMES_PER_SECOND, HISS_WEBSOCKET_WINDOW
+
+# Header of the frame messages: sequence number and time at which the frame was
+# sent, in seconds since the epoch, in network byte order
+FRAME_HEADER = struct.Struct('!Qd')
+
+
+def pack_frame(sequence, frame):
+    """
+    Returns the binary message carrying the given frame
+    :param sequence: Sequence number of the frame
+    :param frame: JPEG image
+    """
+    return FRAME_HEADER.pack(sequence, time.time()) + frame
+
+
+class ViewerControl(object):
+    """
+    Constructor. Settings requested by a WebSocket viewer, and frames it has not
+    acknowledged yet
+    :param tier: Initial size and quality of the frames sent to the viewer
+    :param window: Maximum number of frames not acknowledged by the viewer
+    """
+    def __init__(self, tier, window=HISS_WEBSOCKET_WINDOW):
+        self._tier = tier
+        self._fps = None
+        self._window = window
+        self._acknowledging = False
+        self._unacknowledged = deque()
+        self._condition = threading.Condition()
+
+    @property
+    def tier(self):
+        """
+        Returns the size and quality of the frames requested by the viewer
+        """
+        return self._tier
+
+    @property
+    def fps(self):
+        """
+        Returns the frame rate requested by the viewer, or None for the frame rate
+        of the session
+        """
+        return self._fps
+
+    def handle_message(self, message):
+        """
+        Applies a message sent by the viewer
+        :param message: JSON text message
+        :raise ValueError: If the message is invalid
+        """
+        try:
+            values = json.loads(message)
+        except (TypeError, ValueError):
+            raise ValueError('Messages must be JSON objects')
+        if not isinstance(values, dict):
+            raise ValueError('Messages must be JSON objects')
+        if 'fps' in values:
+            fps = values['fps']
+            if not is_valid_fps(fps):
+                raise ValueError('fps must be a positive number of at most ' +
+                                 str(HISS_MAX_FRAMES_PER_SECOND))
+            self._fps = fps
+        try:
+            if any(name in values for name in ('width', 'height', 'quality')):
+                tier = frame_transcoder.parse_tier(values)
+                if not tier.is_native and not frame_transcoder.is_available():
+                    raise ValueError('Frame transcoding is not available on this server')
+                self._tier = tier
+            acknowledged = int(values['ack']) if 'ack' in values else None
+        except TypeError:
+            raise ValueError('width, height, quality and ack must be integers')
+        if acknowledged is not None:
+            with self._condition:
+                self._acknowledging = True
+                while self._unacknowledged and self._unacknowledged[0] <= acknowledged:
+                    self._unacknowledged.popleft()
+                self._condition.notify_all()
+
+    def sent(self, sequence):
+        """
+        Records that a frame was sent to the viewer
+        :param sequence: Sequence number of the frame
+        """
+        with self._condition:
+            self._unacknowledged.append(sequence)
+            if len(self._unacknowledged) > self._window:
+                self._unacknowledged.popleft()
+
+    def wait_for_window(self, timeout):
+        """
+        Blocks until the viewer acknowledged enough frames for a new one to be sent
+        :param timeout: Maximum number of seconds to wait
+        :return: True if a frame can be sent
+        """
+        with self._condition:
+            if self._can_send():
+                return True
+            self._condition.wait(timeout)
+            return self._can_send()
+
+    def close(self):
+        """
+        Releases the sender waiting for acknowledgements
+        """
+        with self._condition:
+            self._acknowledging = False
+            self._condition.notify_all()
+
+    def _can_send(self):
+        """
+        Returns True if the number of frames not acknowledged is within the window.
+        Must be called with the condition held
+        """
+        if not self._acknowledging:
+            return True
+        return len(self._unacknowledged) < self._window
@@ -22,11 +22,14 @@
 # All rights reserved. Do not distribute without further notice.
 
 """
-WSGI config for http_image_streaming_service project.
+WSGI config for http_image_streaming_service project. When several workers serve
+the application, set HISS_FRAME_BUS so that they share the frames of each session
 """
 
 # pylint: disable=W0403
-from http_image_streaming_service import application
+from http_image_streaming_service import application, supervisor
+
+supervisor.start()
 
 if __name__ == "__main__":
     application.run()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.adaptive_quality import AdaptiveQuality
+from http_image_streaming_service.service.frame_transcoder import FrameTier, NATIVE_TIER
+import http_image_streaming_service.service.settings as settings
+
+import unittest
+
+FRAME_INTERVAL = 0.2
+
+
+class AdaptiveQualityTestCase(unittest.TestCase):
+
+    def test_quality_follows_viewer_speed(self):
+        adaptive_quality = AdaptiveQuality(NATIVE_TIER)
+        self.assertEqual(adaptive_quality.tier, NATIVE_TIER)
+        for _ in range(settings.HISS_SLOW_VIEWER_FRAMES):
+            adaptive_quality.update(1, FRAME_INTERVAL)
+        self.assertEqual(adaptive_quality.tier.quality, settings.HISS_ADAPTIVE_QUALITY_LEVELS[0])
+        for _ in range(settings.HISS_SLOW_VIEWER_FRAMES):
+            adaptive_quality.update(0, FRAME_INTERVAL, dropped_frames=2)
+        self.assertEqual(adaptive_quality.tier.quality, settings.HISS_ADAPTIVE_QUALITY_LEVELS[1])
+        for _ in range(2 * settings.HISS_FAST_VIEWER_FRAMES):
+            adaptive_quality.update(0, FRAME_INTERVAL)
+        self.assertEqual(adaptive_quality.tier, NATIVE_TIER)
+
+    def test_requested_quality_is_an_upper_bound(self):
+        adaptive_quality = AdaptiveQuality(FrameTier(200, None, 50))
+        for _ in range(10 * settings.HISS_SLOW_VIEWER_FRAMES):
+            adaptive_quality.update(1, FRAME_INTERVAL)
+        self.assertEqual(adaptive_quality.tier,
+                         FrameTier(200, None, min(settings.HISS_ADAPTIVE_QUALITY_LEVELS)))
+
+if __name__ == '__main__':
+    unittest.main()
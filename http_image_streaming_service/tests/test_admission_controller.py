@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.admission_controller import AdmissionController
+import http_image_streaming_service.service.http_image_streaming_service as hiss
+import http_image_streaming_service.service.settings \
+    as settings
+
+import json
+import time
+import unittest
+
+DEFAULT_SESSION_ID = 'admissionsession'
+BASE_URL = settings.APPLICATION_NAME + '/' + settings.API_VERSION + '/'
+
+
+class AdmissionControllerTestCase(unittest.TestCase):
+
+    def test_limits(self):
+        controller = AdmissionController(max_per_session=2, max_per_client=3, idle_timeout=0)
+        first = controller.admit('session1', 'client1')
+        second = controller.admit('session1', 'client1')
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertIsNone(controller.admit('session1', 'client2'))
+        self.assertIsNotNone(controller.admit('session2', 'client1'))
+        self.assertIsNone(controller.admit('session3', 'client1'))
+        controller.release(first)
+        self.assertEqual(controller.streams('session1'), 1)
+        self.assertIsNotNone(controller.admit('session1', 'client2'))
+
+    def test_release_is_idempotent(self):
+        controller = AdmissionController(idle_timeout=0)
+        ticket = controller.admit('session1', 'client1')
+        releases = list()
+        ticket.on_release = lambda: releases.append(ticket)
+        controller.release(ticket)
+        controller.release(ticket)
+        self.assertEqual(len(releases), 1)
+        self.assertEqual(controller.streams('session1'), 0)
+
+    def test_idle_streams_are_reaped(self):
+        controller = AdmissionController(idle_timeout=3600)
+        idle = controller.admit('session1', 'client1')
+        active = controller.admit('session1', 'client1')
+        idle.last_write = time.time() - 3600
+        active.touch()
+        controller.reap_idle_streams()
+        self.assertTrue(idle.released)
+        self.assertFalse(active.released)
+        self.assertEqual(controller.streams('session1'), 1)
+
+
+class StreamAdmissionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.admission = hiss.admission
+        hiss.admission = AdmissionController(max_per_session=1, idle_timeout=0)
+        self.tester = hiss.application.test_client(self)
+        self.headers = {'Cookie': 'HBP=' + DEFAULT_SESSION_ID + ';'}
+        self.tester.post(BASE_URL + 'route', content_type='application/json',
+                         headers=self.headers,
+                         data=json.dumps({'uri': 'http://localhost:3000'}))
+
+    def tearDown(self):
+        self.tester.delete(BASE_URL + 'route', headers=self.headers)
+        hiss.admission = self.admission
+
+    def test_too_many_streams(self):
+        response = self.tester.get(BASE_URL + 'image_streaming_feed/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 200)
+        refused = self.tester.get(BASE_URL + 'image_streaming_feed/' + DEFAULT_SESSION_ID)
+        self.assertEqual(refused.status_code, 429)
+        self.assertEqual(refused.headers['Retry-After'], str(settings.HISS_STREAM_RETRY_AFTER))
+
+    def test_clients_behind_trusted_proxy(self):
+        hiss.admission = AdmissionController(max_per_session=0, max_per_client=1,
+                                             idle_timeout=0)
+        trusted_proxies = settings.HISS_TRUSTED_PROXIES
+        settings.HISS_TRUSTED_PROXIES = ['10.0.0.1']
+        try:
+            url = BASE_URL + 'image_streaming_feed/' + DEFAULT_SESSION_ID
+            proxy = {'REMOTE_ADDR': '10.0.0.1'}
+            response = self.tester.get(url, environ_base=proxy,
+                                       headers={'X-Forwarded-For': '192.168.0.1'})
+            self.assertEqual(response.status_code, 200)
+            response = self.tester.get(url, environ_base=proxy,
+                                       headers={'X-Forwarded-For': '192.168.0.2, 10.0.0.1'})
+            self.assertEqual(response.status_code, 200)
+            # Addresses forwarded by untrusted clients are ignored
+            response = self.tester.get(url, environ_base={'REMOTE_ADDR': '192.168.0.1'},
+                                       headers={'X-Forwarded-For': '192.168.0.3'})
+            self.assertEqual(response.status_code, 429)
+        finally:
+            settings.HISS_TRUSTED_PROXIES = trusted_proxies
+
+if __name__ == '__main__':
+    unittest.main()
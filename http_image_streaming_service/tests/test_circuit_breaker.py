@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.circuit_breaker import CircuitBreaker, \
+    CLOSED, OPEN, HALF_OPEN, get_circuit_breaker
+import http_image_streaming_service.service.circuit_breaker as circuit_breaker
+import http_image_streaming_service.service.settings as settings
+
+import time
+import unittest
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+
+    def test_circuit_opens_after_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, backoff=60)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.record_failure())
+        breaker.record_success()
+        self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.record_failure())
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, backoff=0.02, max_backoff=0.04)
+        self.assertTrue(breaker.record_failure())
+        time.sleep(0.02)
+        # A single probe is allowed once the backoff delay has elapsed
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertTrue(breaker.record_failure())
+        self.assertFalse(breaker.allow())
+        time.sleep(0.04)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_idle_breakers_are_discarded(self):
+        uri = 'http://renderer/idle'
+        breaker = get_circuit_breaker(uri)
+        self.assertIs(get_circuit_breaker(uri), breaker)
+        circuit_breaker.HISS_UPSTREAM_IDLE_TIMEOUT = 0
+        circuit_breaker._next_expiry[0] = 0
+        try:
+            self.assertIsNot(get_circuit_breaker(uri), breaker)
+        finally:
+            circuit_breaker.HISS_UPSTREAM_IDLE_TIMEOUT = settings.HISS_UPSTREAM_IDLE_TIMEOUT
+
+
+if __name__ == '__main__':
+    unittest.main()
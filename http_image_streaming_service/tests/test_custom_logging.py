@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+
+import http_image_streaming_service.service.custom_logging as log
+
+import json
+import logging
+import sys
+import unittest
+
+
+class CountingArgument(object):
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return 'argument'
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.setFormatter(log.JsonFormatter())
+        self.records = list()
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+
+class CustomLoggingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.level = log.L.level
+        self.handlers = log.L.handlers
+        self.handler = RecordingHandler()
+        log.L.handlers = [self.handler]
+
+    def tearDown(self):
+        log.L.setLevel(self.level)
+        log.L.handlers = self.handlers
+
+    def test_messages_are_formatted_lazily(self):
+        argument = CountingArgument()
+        log.L.setLevel(logging.ERROR)
+        log.info(1, 'Info %s', argument)
+        log.debug(1, 'Debug %s', argument)
+        self.assertEqual(argument.formatted, 0)
+        self.assertEqual(self.handler.records, [])
+
+        log.L.setLevel(logging.INFO)
+        log.info(1, 'Info %s', argument)
+        log.debug(1, 'Debug %s', argument)
+        self.assertEqual(argument.formatted, 1)
+        self.assertEqual(len(self.handler.records), 1)
+
+    def test_json_records(self):
+        log.L.setLevel(logging.DEBUG)
+        log.debug(2, 'Session %s has %d viewer(s)', 'session', 3)
+        record = json.loads(self.handler.records[0])
+        self.assertEqual(sorted(record.keys()),
+                         ['level', 'message', 'thread', 'timestamp', 'verbosity'])
+        self.assertEqual(record['level'], 'DEBUG')
+        self.assertEqual(record['verbosity'], 2)
+        self.assertEqual(record['message'], 'Session session has 3 viewer(s)')
+
+        try:
+            raise ValueError('failure')
+        except ValueError:
+            log.L.error('Error %s', 'message', exc_info=sys.exc_info())
+        record = json.loads(self.handler.records[1])
+        self.assertEqual(record['level'], 'ERROR')
+        self.assertIsNone(record['verbosity'])
+        self.assertEqual(record['message'], 'Error message')
+        self.assertIn('ValueError: failure', record['exception'])
+
+if __name__ == '__main__':
+    unittest.main()
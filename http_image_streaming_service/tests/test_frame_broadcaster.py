@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_broadcaster import BroadcasterRegistry, \
+    FrameBroadcaster
+from http_image_streaming_service.service.frame_bus import LocalFrameBus
+from http_image_streaming_service.service.frame_transcoder import FrameTier
+import http_image_streaming_service.service.frame_transcoder as frame_transcoder
+from flask import Flask
+
+import requests
+import threading
+import time
+import unittest
+
+DEFAULT_SESSION_ID = 'testsession'
+FRAME_NOT_FOUND = b'not found'
+
+
+class FakeRouteManager(object):
+
+    def __init__(self):
+        self.routes = set([DEFAULT_SESSION_ID])
+
+    def has_route(self, session_id):
+        return session_id in self.routes
+
+    def get_route_fps(self, session_id):
+        return 100
+
+    def delete_route(self, session_id):
+        self.routes.discard(session_id)
+
+
+class FakeFrameGrabber(object):
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_frame(self):
+        with self._lock:
+            self.calls += 1
+            frame = b'frame' + str(self.calls).encode()
+        time.sleep(0.01)
+        return frame
+
+
+class UnreachableFrameGrabber(object):
+
+    def get_frame(self):
+        time.sleep(0.01)
+        raise requests.exceptions.ConnectionError('Connection refused')
+
+
+class BroadcasterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.route_manager = FakeRouteManager()
+        self.registry = BroadcasterRegistry(self.route_manager, FRAME_NOT_FOUND,
+                                            Flask(__name__))
+
+    def test_viewers_share_one_grabber(self):
+        first_grabber = FakeFrameGrabber()
+        second_grabber = FakeFrameGrabber()
+        first = self.registry.subscribe(DEFAULT_SESSION_ID, first_grabber)
+        second = self.registry.subscribe(DEFAULT_SESSION_ID, second_grabber)
+        self.assertIs(first, second)
+        self.assertEqual(self.registry.viewers(), {DEFAULT_SESSION_ID: 2})
+
+        sequence, frame = first.wait_for_frame(0, timeout=1)
+        self.assertTrue(sequence > 0)
+        self.assertTrue(frame.startswith(b'frame'))
+        _, frame = second.wait_for_frame(0, timeout=1)
+        self.assertTrue(frame.startswith(b'frame'))
+        self.assertEqual(second_grabber.calls, 0)
+
+        self.registry.unsubscribe(first)
+        self.assertTrue(second.running)
+        self.registry.unsubscribe(second)
+        self.assertFalse(second.running)
+        self.assertIsNone(self.registry.get(DEFAULT_SESSION_ID))
+
+    def test_workers_share_one_grabber(self):
+        frame_bus = LocalFrameBus()
+        other_registry = BroadcasterRegistry(self.route_manager, FRAME_NOT_FOUND,
+                                             Flask(__name__), LocalFrameBus(frame_bus.hub))
+        self.registry = BroadcasterRegistry(self.route_manager, FRAME_NOT_FOUND,
+                                            Flask(__name__), frame_bus)
+        first_grabber = FakeFrameGrabber()
+        second_grabber = FakeFrameGrabber()
+        owner = self.registry.subscribe(DEFAULT_SESSION_ID, first_grabber)
+        owner.wait_for_frame(0, timeout=1)
+        follower = other_registry.subscribe(DEFAULT_SESSION_ID, second_grabber)
+        _, frame = follower.wait_for_frame(0, timeout=1)
+        self.assertTrue(frame.startswith(b'frame'))
+        self.assertEqual(second_grabber.calls, 0)
+        self.registry.unsubscribe(owner)
+
+        # The follower takes over when the owner has no viewers anymore
+        calls = second_grabber.calls
+        for _ in range(100):
+            if second_grabber.calls > calls:
+                break
+            time.sleep(0.01)
+        self.assertTrue(second_grabber.calls > calls)
+        other_registry.unsubscribe(follower)
+
+    def test_frames_pushed_to_another_worker(self):
+        frame_bus = LocalFrameBus()
+        pushing_registry = BroadcasterRegistry(self.route_manager, FRAME_NOT_FOUND,
+                                               Flask(__name__), LocalFrameBus(frame_bus.hub))
+        self.registry = BroadcasterRegistry(self.route_manager, FRAME_NOT_FOUND,
+                                            Flask(__name__), frame_bus)
+        grabber = FakeFrameGrabber()
+        broadcaster = self.registry.subscribe(DEFAULT_SESSION_ID, grabber)
+        sequence, frame = broadcaster.wait_for_frame(0, timeout=1)
+        self.assertTrue(frame.startswith(b'frame'))
+
+        # The worker receiving the frames has no viewer of the session
+        for index in range(10):
+            pushing_registry.push(DEFAULT_SESSION_ID, b'pushed' + str(index).encode())
+            time.sleep(0.02)
+        calls = grabber.calls
+        frames = list()
+        for _ in range(10):
+            sequence, frame = broadcaster.wait_for_frame(sequence, timeout=0.1)
+            if frame is not None:
+                frames.append(frame)
+        self.assertEqual(frames[-1], b'pushed9')
+        # The worker owning the session stopped polling the rendering resource
+        self.assertEqual(grabber.calls, calls)
+        self.registry.unsubscribe(broadcaster)
+
+    def test_frames_are_transcoded_once_per_tier(self):
+        transcoded = list()
+
+        def transcode(frame, tier):
+            transcoded.append((frame, tier))
+            return frame + b' ' + str(tier.width).encode()
+
+        original_transcode = frame_transcoder.transcode
+        frame_transcoder.transcode = transcode
+        try:
+            broadcaster = FrameBroadcaster(DEFAULT_SESSION_ID, FakeFrameGrabber(),
+                                           self.route_manager, FRAME_NOT_FOUND, None)
+            tier = FrameTier(100, None, None)
+            broadcaster.publish(b'frame1')
+            self.assertEqual(broadcaster.wait_for_frame(0, tier=tier), (1, b'frame1 100'))
+            self.assertEqual(broadcaster.wait_for_frame(0, tier=tier), (1, b'frame1 100'))
+            self.assertEqual(broadcaster.wait_for_frame(0), (1, b'frame1'))
+            self.assertEqual(len(transcoded), 1)
+            broadcaster.publish(b'frame2')
+            self.assertEqual(broadcaster.wait_for_frame(1, tier=tier), (2, b'frame2 100'))
+            self.assertEqual(len(transcoded), 2)
+        finally:
+            frame_transcoder.transcode = original_transcode
+
+    def test_grab_loop_stops_when_route_is_removed(self):
+        broadcaster = self.registry.subscribe(DEFAULT_SESSION_ID, FakeFrameGrabber())
+        broadcaster.wait_for_frame(0, timeout=1)
+        self.route_manager.delete_route(DEFAULT_SESSION_ID)
+        for _ in range(100):
+            if not broadcaster.running:
+                break
+            time.sleep(0.01)
+        self.assertFalse(broadcaster.running)
+        self.registry.unsubscribe(broadcaster)
+        self.assertEqual(self.registry.viewers(), {})
+
+    def test_lost_connection_serves_frame_not_found(self):
+        broadcaster = self.registry.subscribe(DEFAULT_SESSION_ID, UnreachableFrameGrabber())
+        _, frame = broadcaster.wait_for_frame(0, timeout=1)
+        self.assertEqual(frame, FRAME_NOT_FOUND)
+        # The route is left to the route supervisor
+        self.assertTrue(broadcaster.running)
+        self.assertTrue(self.route_manager.has_route(DEFAULT_SESSION_ID))
+        self.registry.unsubscribe(broadcaster)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_bus import LocalFrameBus, \
+    SharedDirectoryFrameBus
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+DEFAULT_SESSION_ID = 'testsession'
+
+
+class FrameBusTestCase(object):
+
+    def create_buses(self):
+        raise NotImplementedError
+
+    def test_single_owner(self):
+        first, second = self.create_buses()
+        self.assertTrue(first.acquire(DEFAULT_SESSION_ID))
+        self.assertTrue(first.acquire(DEFAULT_SESSION_ID))
+        self.assertFalse(second.acquire(DEFAULT_SESSION_ID))
+        self.assertTrue(second.acquire('othersession'))
+        first.release(DEFAULT_SESSION_ID)
+        self.assertTrue(second.acquire(DEFAULT_SESSION_ID))
+        second.release(DEFAULT_SESSION_ID)
+        second.release('othersession')
+
+    def test_followers_receive_frames(self):
+        owner, follower = self.create_buses()
+        self.assertEqual(follower.latest(DEFAULT_SESSION_ID, 0), (0, None))
+        owner.acquire(DEFAULT_SESSION_ID)
+        owner.publish(DEFAULT_SESSION_ID, b'frame1')
+        sequence, frame = follower.latest(DEFAULT_SESSION_ID, 0)
+        self.assertEqual(frame, b'frame1')
+        self.assertEqual(follower.latest(DEFAULT_SESSION_ID, sequence), (sequence, None))
+
+        # The frames of a new owner follow those of the previous one
+        owner.release(DEFAULT_SESSION_ID)
+        follower.acquire(DEFAULT_SESSION_ID)
+        follower.publish(DEFAULT_SESSION_ID, b'frame2')
+        next_sequence, frame = owner.latest(DEFAULT_SESSION_ID, sequence)
+        self.assertEqual(frame, b'frame2')
+        self.assertTrue(next_sequence > sequence)
+        follower.release(DEFAULT_SESSION_ID)
+
+    def test_pushed_frames(self):
+        owner, pusher = self.create_buses()
+        # Frames pushed to a session without owner are not published
+        self.assertIsNone(pusher.push(DEFAULT_SESSION_ID, b'frame1'))
+        self.assertEqual(owner.pushed_at(DEFAULT_SESSION_ID), 0)
+        owner.acquire(DEFAULT_SESSION_ID)
+        sequence = pusher.push(DEFAULT_SESSION_ID, b'frame2')
+        self.assertEqual(owner.latest(DEFAULT_SESSION_ID, 0), (sequence, b'frame2'))
+        self.assertTrue(time.time() - owner.pushed_at(DEFAULT_SESSION_ID) < 1)
+        owner.release(DEFAULT_SESSION_ID)
+
+
+class LocalFrameBusTestCase(FrameBusTestCase, unittest.TestCase):
+
+    def create_buses(self):
+        bus = LocalFrameBus()
+        return bus, LocalFrameBus(bus.hub)
+
+
+class SharedDirectoryFrameBusTestCase(FrameBusTestCase, unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._folder)
+
+    def create_buses(self):
+        return SharedDirectoryFrameBus(self._folder), SharedDirectoryFrameBus(self._folder)
+
+    def test_release_removes_files(self):
+        owner, follower = self.create_buses()
+        owner.acquire(DEFAULT_SESSION_ID)
+        owner.publish(DEFAULT_SESSION_ID, b'frame1')
+        self.assertEqual(follower.latest(DEFAULT_SESSION_ID, 0)[1], b'frame1')
+        self.assertEqual(len(os.listdir(self._folder)), 2)
+        owner.release(DEFAULT_SESSION_ID)
+        self.assertEqual(os.listdir(self._folder), [])
+        self.assertEqual(follower.latest(DEFAULT_SESSION_ID, 0), (0, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_clock import FrameClock, is_valid_fps
+
+import time
+import unittest
+
+
+class FrameClockTestCase(unittest.TestCase):
+
+    def test_frames_are_paced(self):
+        clock = FrameClock(50)
+        start = time.time()
+        for _ in range(6):
+            self.assertEqual(clock.wait(), 0)
+        # The first frame is not delayed
+        self.assertAlmostEqual(time.time() - start, 0.1, delta=0.05)
+
+    def test_late_frames_are_skipped(self):
+        clock = FrameClock(50)
+        clock.wait()
+        time.sleep(0.07)
+        self.assertEqual(clock.wait(), 2)
+        self.assertEqual(clock.skipped, 2)
+        # Once realigned, the clock does not try to catch up
+        start = time.time()
+        self.assertEqual(clock.wait(), 0)
+        self.assertTrue(time.time() - start > 0.005)
+
+    def test_change_fps(self):
+        clock = FrameClock(50)
+        self.assertEqual(clock.fps, 50)
+        clock.fps = 10
+        self.assertEqual(clock.fps, 10)
+
+    def test_valid_fps(self):
+        for fps in (None, 0.5, 25):
+            self.assertTrue(is_valid_fps(fps))
+        for fps in (0, -1, True, '25', float('inf'), float('nan'), 1e9):
+            self.assertFalse(is_valid_fps(fps))
+
+if __name__ == '__main__':
+    unittest.main()
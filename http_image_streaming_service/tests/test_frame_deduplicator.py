@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_deduplicator import FrameDeduplicator
+
+import unittest
+
+
+class FrameDeduplicatorTestCase(unittest.TestCase):
+
+    def test_duplicated_frames(self):
+        deduplicator = FrameDeduplicator()
+        self.assertFalse(deduplicator.is_duplicate(b'frame1'))
+        self.assertTrue(deduplicator.is_duplicate(b'frame1'))
+        self.assertFalse(deduplicator.is_duplicate(b'frame2'))
+        self.assertFalse(deduplicator.is_duplicate(b'frame1'))
+
+    def test_state_is_per_viewer(self):
+        first = FrameDeduplicator()
+        second = FrameDeduplicator()
+        self.assertFalse(first.is_duplicate(b'frame1'))
+        self.assertFalse(second.is_duplicate(b'frame1'))
+
+if __name__ == '__main__':
+    unittest.main()
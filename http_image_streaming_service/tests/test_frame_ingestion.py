@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_ingestion import read_frames
+from http_image_streaming_service.service.http_image_streaming_service import application, \
+    broadcasters
+import http_image_streaming_service.service.settings \
+    as settings
+
+from io import BytesIO
+import json
+import unittest
+
+DEFAULT_SESSION_ID = 'pushsession'
+BASE_URL = settings.APPLICATION_NAME + '/' + settings.API_VERSION + '/'
+
+
+def multipart(frames, boundary='frame'):
+    body = b''
+    for frame in frames:
+        body += (b'--' + boundary.encode() + b'\r\nContent-Type: image/jpeg\r\n'
+                 b'Content-Length: ' + str(len(frame)).encode() + b'\r\n\r\n' +
+                 frame + b'\r\n')
+    return body
+
+
+class ReadFramesTestCase(unittest.TestCase):
+
+    def test_read_frames(self):
+        frames = [b'frame1', b'\r\n--frame\r\n', b'']
+        stream = BytesIO(multipart(frames) + b'--frame--\r\n')
+        self.assertEqual(list(read_frames(stream, 'frame', 100)), frames)
+
+    def test_missing_content_length(self):
+        stream = BytesIO(b'--frame\r\nContent-Type: image/jpeg\r\n\r\nframe1\r\n')
+        self.assertRaises(ValueError, list, read_frames(stream, 'frame', 100))
+
+    def test_frame_too_large(self):
+        stream = BytesIO(multipart([b'x' * 101]))
+        self.assertRaises(ValueError, list, read_frames(stream, 'frame', 100))
+
+    def test_truncated_frame(self):
+        stream = BytesIO(multipart([b'frame1'])[:-4])
+        self.assertRaises(ValueError, list, read_frames(stream, 'frame', 100))
+
+
+class IngestionFeedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tester = application.test_client(self)
+        self.headers = {'Cookie': 'HBP=' + DEFAULT_SESSION_ID + ';'}
+        response = self.tester.post(BASE_URL + 'route', content_type='application/json',
+                                    headers=self.headers,
+                                    data=json.dumps({'uri': 'http://localhost:3000'}))
+        self.assertEqual(response.status_code, 201)
+
+    def tearDown(self):
+        self.tester.delete(BASE_URL + 'route', headers=self.headers)
+
+    def test_push_frame(self):
+        response = self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                                    content_type='image/jpeg', data=b'frame1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_push_stream(self):
+        response = self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                                    content_type='multipart/x-mixed-replace; boundary=frame',
+                                    data=multipart([b'frame1', b'frame2']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'2 frame(s) received')
+
+    def test_push_without_route(self):
+        response = self.tester.post(BASE_URL + 'image_ingestion_feed/unknown',
+                                    content_type='image/jpeg', data=b'frame1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_push_unsupported_content_type(self):
+        response = self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                                    content_type='text/plain', data=b'frame1')
+        self.assertEqual(response.status_code, 415)
+
+    def test_pushed_frames_are_streamed(self):
+        self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                         content_type='image/jpeg', data=b'frame1')
+        broadcaster = broadcasters.subscribe(DEFAULT_SESSION_ID, None)
+        try:
+            self.assertEqual(broadcaster.wait_for_frame(0, timeout=1)[1], b'frame1')
+            self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                             content_type='image/jpeg', data=b'frame2')
+            self.assertEqual(broadcaster.wait_for_frame(1, timeout=1)[1], b'frame2')
+        finally:
+            broadcasters.unsubscribe(broadcaster)
+
+    def test_pushed_frame_is_removed_with_route(self):
+        self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                         content_type='image/jpeg', data=b'frame1')
+        self.assertEqual(broadcasters.latest_frame(DEFAULT_SESSION_ID), b'frame1')
+        self.tester.delete(BASE_URL + 'route', headers=self.headers)
+        self.assertIsNone(broadcasters.latest_frame(DEFAULT_SESSION_ID))
+
+
+if __name__ == '__main__':
+    unittest.main()
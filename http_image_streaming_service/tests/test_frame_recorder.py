@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+
+from http_image_streaming_service.service.frame_recorder import FrameRecorder, \
+    RecordingReader, recording_paths
+from http_image_streaming_service.service.http_image_streaming_service import application, \
+    replayer
+from http_image_streaming_service.tests.test_rest_frame_grabber import FakeRenderer
+import http_image_streaming_service.service.settings \
+    as settings
+
+import json
+import shutil
+import tempfile
+import time
+import unittest
+
+DEFAULT_SESSION_ID = 'recordedsession'
+BASE_URL = settings.APPLICATION_NAME + '/' + settings.API_VERSION + '/'
+
+
+class FrameRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_record_and_seek(self):
+        recorder = FrameRecorder(self.folder, DEFAULT_SESSION_ID)
+        recorder.record(b'frame1', 10)
+        recorder.record(b'frame2', 11)
+        reader = RecordingReader(self.folder, DEFAULT_SESSION_ID)
+        self.assertEqual(len(reader), 2)
+
+        # Frames recorded after the reader was opened are visible
+        recorder.record(b'frame3', 12)
+        recorder.close()
+        self.assertEqual(len(reader), 3)
+        self.assertEqual([reader.frame(index) for index in range(3)],
+                         [b'frame1', b'frame2', b'frame3'])
+        self.assertEqual(reader.timestamp(2), 12)
+        self.assertEqual(reader.seek(0), 0)
+        self.assertEqual(reader.seek(10.5), 1)
+        self.assertEqual(reader.seek(11), 1)
+        self.assertEqual(reader.seek(13), 3)
+        reader.close()
+
+    def test_recordings_are_appended(self):
+        recorder = FrameRecorder(self.folder, DEFAULT_SESSION_ID)
+        recorder.record(b'frame1', 10)
+        recorder.close()
+        # Recording a closed recorder is ignored
+        recorder.record(b'ignored', 11)
+
+        # A partial index entry left by a recorder that died is dropped
+        _, index_path = recording_paths(self.folder, DEFAULT_SESSION_ID)
+        with open(index_path, 'ab') as index_file:
+            index_file.write(b'partial')
+        recorder = FrameRecorder(self.folder, DEFAULT_SESSION_ID)
+        recorder.record(b'frame2', 12)
+        recorder.close()
+        reader = RecordingReader(self.folder, DEFAULT_SESSION_ID)
+        self.assertEqual([reader.frame(index) for index in range(len(reader))],
+                         [b'frame1', b'frame2'])
+        reader.close()
+
+    def test_one_recorder_per_session(self):
+        recorder = FrameRecorder(self.folder, DEFAULT_SESSION_ID)
+        self.assertRaises(IOError, FrameRecorder, self.folder, DEFAULT_SESSION_ID)
+        recorder.close()
+        FrameRecorder(self.folder, DEFAULT_SESSION_ID).close()
+
+    def test_missing_recording(self):
+        self.assertRaises(IOError, RecordingReader, self.folder, DEFAULT_SESSION_ID)
+
+
+class ReplayEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.recording_dir = settings.HISS_RECORDING_DIR
+        settings.HISS_RECORDING_DIR = self.folder
+        self.renderer = FakeRenderer()
+        self.tester = application.test_client(self)
+        self.headers = {'Cookie': 'HBP=' + DEFAULT_SESSION_ID + ';'}
+        response = self.tester.post(BASE_URL + 'route', content_type='application/json',
+                                    headers=self.headers,
+                                    data=json.dumps({'uri': self.renderer.uri}))
+        self.assertEqual(response.status_code, 201)
+
+    def tearDown(self):
+        self.tester.delete(BASE_URL + 'recording/' + DEFAULT_SESSION_ID)
+        self.tester.delete(BASE_URL + 'route', headers=self.headers)
+        self.renderer.stop()
+        settings.HISS_RECORDING_DIR = self.recording_dir
+        shutil.rmtree(self.folder)
+
+    def test_record_and_replay(self):
+        response = self.tester.get(BASE_URL + 'replay/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 404)
+        response = self.tester.post(BASE_URL + 'recording/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 201)
+        response = self.tester.post(BASE_URL + 'recording/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 409)
+
+        # Pushed frames are recorded even if the session has no viewers
+        for frame in (b'pushed1', b'pushed2', b'pushed3'):
+            response = self.tester.post(BASE_URL + 'image_ingestion_feed/' + DEFAULT_SESSION_ID,
+                                        content_type='image/jpeg', data=frame)
+            self.assertEqual(response.status_code, 200)
+        response = self.tester.delete(BASE_URL + 'recording/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 200)
+        response = self.tester.delete(BASE_URL + 'recording/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 404)
+
+        response = self.tester.get(BASE_URL + 'replay/' + DEFAULT_SESSION_ID + '?speed=100')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'multipart/x-mixed-replace')
+        self.assertEqual(response.data.count(b'--frame\r\n'), 3)
+        self.assertTrue(response.data.index(b'pushed1') < response.data.index(b'pushed3'))
+        for start in ('1000', 'inf', 'nan'):
+            response = self.tester.get(BASE_URL + 'replay/' + DEFAULT_SESSION_ID +
+                                       '?loop=true&start=' + start)
+            self.assertEqual(response.status_code, 400)
+
+    def test_replay_past_the_end(self):
+        recorder = FrameRecorder(self.folder, DEFAULT_SESSION_ID)
+        recorder.record(b'frame1', 10)
+        recorder.close()
+        reader = RecordingReader(self.folder, DEFAULT_SESSION_ID)
+        # A looped replay with no frame to send ends instead of spinning
+        self.assertEqual(list(replayer(reader, start=1000, loop=True)), [])
+
+    def test_looped_replay_is_paced(self):
+        recorder = FrameRecorder(self.folder, DEFAULT_SESSION_ID)
+        recorder.record(b'frame1', 10)
+        recorder.close()
+        stream = replayer(RecordingReader(self.folder, DEFAULT_SESSION_ID), speed=10,
+                          loop=True)
+        start = time.time()
+        chunks = [next(stream) for _ in range(9)]
+        stream.close()
+        self.assertEqual(chunks.count(b'frame1'), 3)
+        # The frame is sent again every HISS_REPLAY_MAX_GAP / speed seconds
+        self.assertTrue(time.time() - start >= 2 * settings.HISS_REPLAY_MAX_GAP / 10.0)
+
+    def test_invalid_replay(self):
+        response = self.tester.get(BASE_URL + 'replay/' + DEFAULT_SESSION_ID + '?speed=0')
+        self.assertEqual(response.status_code, 400)
+        response = self.tester.post(BASE_URL + 'recording/unknown')
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_ring_buffer import FrameRingBuffer
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+def _write_frames(path, duration):
+    """
+    Writes frames made of a single repeated byte for the given number of seconds
+    """
+    writer = FrameRingBuffer(path, 100000, slots=4)
+    deadline = time.time() + duration
+    index = 0
+    while time.time() < deadline:
+        writer.write(chr(ord('a') + index % 26).encode() * 100000)
+        index += 1
+    writer.close()
+
+
+class FrameRingBufferTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp()
+        self._path = os.path.join(self._folder, 'session.ring')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder)
+
+    def test_read_latest(self):
+        writer = FrameRingBuffer(self._path, 64, slots=4)
+        reader = FrameRingBuffer(self._path, 64, slots=4)
+        self.assertEqual(reader.read_latest(0), (0, None))
+        self.assertEqual(writer.write(b'frame1'), 1)
+        self.assertEqual(reader.read_latest(0), (1, b'frame1'))
+        self.assertEqual(reader.read_latest(1), (1, None))
+        writer.write(b'frame2')
+        writer.write(b'frame3')
+        self.assertEqual(reader.read_latest(1), (3, b'frame3'))
+        writer.close()
+        reader.close()
+
+    def test_frames_wrap_around(self):
+        writer = FrameRingBuffer(self._path, 64, slots=4)
+        for index in range(50):
+            frame = str(index).encode() * 10
+            sequence = writer.write(frame)
+            self.assertEqual(writer.read_latest(sequence - 1), (sequence, frame))
+        writer.close()
+
+        # Frames and sequence numbers are kept when the buffer is reopened
+        reader = FrameRingBuffer(self._path, 64, slots=4)
+        self.assertEqual(reader.read_latest(0), (50, b'49' * 10))
+        reader.close()
+
+    def test_frames_are_not_torn(self):
+        reader = FrameRingBuffer(self._path, 100000, slots=4)
+        writer = multiprocessing.Process(target=_write_frames, args=(self._path, 1))
+        writer.start()
+        sequence = 0
+        while writer.is_alive():
+            # Frames overwritten while being copied are never returned
+            sequence, frame = reader.read_latest(sequence)
+            if frame is not None:
+                self.assertEqual(frame, frame[:1] * len(frame))
+        writer.join()
+        reader.close()
+
+    def test_frame_too_large(self):
+        writer = FrameRingBuffer(self._path, 64)
+        self.assertRaises(ValueError, writer.write, b'x' * 65)
+        writer.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_transcoder import FrameTier, parse_tier
+import http_image_streaming_service.service.frame_transcoder as frame_transcoder
+
+from io import BytesIO
+import os
+import unittest
+
+FRAME = open(os.path.join(os.path.dirname(__file__),
+                          '../resources/image_not_found.jpg'), 'rb').read()
+
+
+class FrameTierTestCase(unittest.TestCase):
+
+    def test_parse_tier(self):
+        self.assertTrue(parse_tier({}).is_native)
+        self.assertEqual(parse_tier({'width': '200', 'quality': '50'}),
+                         FrameTier(200, None, 50))
+        self.assertRaises(ValueError, parse_tier, {'width': 'wide'})
+        self.assertRaises(ValueError, parse_tier, {'quality': '0'})
+
+
+@unittest.skipIf(not frame_transcoder.is_available(), 'Pillow is not installed')
+class TranscodeTestCase(unittest.TestCase):
+
+    def test_resize(self):
+        from PIL import Image
+        frame = frame_transcoder.transcode(FRAME, FrameTier(60, None, 50))
+        self.assertEqual(Image.open(BytesIO(frame)).size, (60, 60))
+
+    def test_frames_are_not_enlarged(self):
+        from PIL import Image
+        frame = frame_transcoder.transcode(FRAME, FrameTier(1000, 1000, None))
+        self.assertEqual(Image.open(BytesIO(frame)).size, (120, 120))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.http_image_streaming_service import application
+from http_image_streaming_service.service.metrics import Counter, Histogram
+import http_image_streaming_service.service.metrics as metrics
+import http_image_streaming_service.service.settings as settings
+
+import unittest
+
+BASE_URL = settings.APPLICATION_NAME + '/' + settings.API_VERSION + '/'
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_counter(self):
+        counter = Counter('test_counter_total', 'Test counter', ['session_id'])
+        counter.labels('1').inc()
+        counter.labels('1').inc(2)
+        counter.labels('2').inc()
+        self.assertEqual(counter.render(), [
+            '# HELP test_counter_total Test counter',
+            '# TYPE test_counter_total counter',
+            'test_counter_total{session_id="1"} 3.0',
+            'test_counter_total{session_id="2"} 1.0'])
+        metrics.remove_session('1')
+        self.assertEqual(counter.render()[2:], ['test_counter_total{session_id="2"} 1.0'])
+
+    def test_histogram(self):
+        histogram = Histogram('test_seconds', 'Test histogram', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{le="0.1"} 1.0',
+            'test_seconds_bucket{le="1.0"} 2.0',
+            'test_seconds_bucket{le="+Inf"} 3.0',
+            'test_seconds_count 3.0',
+            'test_seconds_sum 5.55'])
+
+    def test_metrics_endpoint(self):
+        tester = application.test_client(self)
+        response = tester.get(BASE_URL + 'metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn(b'# TYPE hiss_db_query_seconds histogram', response.data)
+
+    def test_session_metrics_removed_with_route(self):
+        tester = application.test_client(self)
+        headers = {'Cookie': 'HBP=metricssession;'}
+        tester.post(BASE_URL + 'route', content_type='application/json', headers=headers,
+                    data='{"uri": "http://localhost:3000"}')
+        # Pushed sessions have metrics without ever being viewed
+        tester.post(BASE_URL + 'image_ingestion_feed/metricssession',
+                    content_type='image/jpeg', data=b'frame')
+        self.assertIn(b'session_id="metricssession"', tester.get(BASE_URL + 'metrics').data)
+        tester.delete(BASE_URL + 'route', headers=headers)
+        self.assertNotIn(b'session_id="metricssession"', tester.get(BASE_URL + 'metrics').data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.circuit_breaker import CircuitOpenError
+from http_image_streaming_service.service.rest_frame_grabber import RestFrameGrabber, \
+    get_session
+import http_image_streaming_service.service.rest_frame_grabber as rest_frame_grabber
+import http_image_streaming_service.service.settings as settings
+
+import base64
+import json
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+DEFAULT_FRAME = b'\xff\xd8jpeg\xff\xd9'
+
+
+class FakeRendererHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests += 1
+        body = json.dumps({'data': base64.b64encode(DEFAULT_FRAME).decode()}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BinaryRendererHandler(FakeRendererHandler):
+
+    def do_GET(self):
+        if 'image/jpeg' not in self.headers.get('Accept', ''):
+            FakeRendererHandler.do_GET(self)
+            return
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(DEFAULT_FRAME)))
+        self.end_headers()
+        self.wfile.write(DEFAULT_FRAME)
+
+
+class ConditionalRendererHandler(FakeRendererHandler):
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.headers.get('If-None-Match') == '"1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(DEFAULT_FRAME)))
+        self.send_header('ETag', '"1"')
+        self.end_headers()
+        self.wfile.write(DEFAULT_FRAME)
+
+
+class FailingRendererHandler(FakeRendererHandler):
+
+    def do_GET(self):
+        self.server.requests += 1
+        self.send_response(500)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class FakeRendererServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class FakeRenderer(object):
+
+    def __init__(self, handler=FakeRendererHandler):
+        self.server = FakeRendererServer(('127.0.0.1', 0), handler)
+        self.server.connections = 0
+        self.server.requests = 0
+        self.uri = 'http://127.0.0.1:' + str(self.server.server_port)
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        # Closes the keep-alive connections so that the handler threads terminate
+        get_session(self.uri).close()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RestFrameGrabberTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.renderer = FakeRenderer()
+
+    def tearDown(self):
+        self.renderer.stop()
+
+    def test_get_frame(self):
+        frame_grabber = RestFrameGrabber(self.renderer.uri)
+        self.assertEqual(frame_grabber.get_frame(), DEFAULT_FRAME)
+
+    def test_get_binary_frame(self):
+        renderer = FakeRenderer(BinaryRendererHandler)
+        try:
+            frame_grabber = RestFrameGrabber(renderer.uri)
+            self.assertEqual(frame_grabber.get_frame(), DEFAULT_FRAME)
+        finally:
+            renderer.stop()
+
+    def test_unchanged_frames_are_not_downloaded(self):
+        renderer = FakeRenderer(ConditionalRendererHandler)
+        try:
+            frame_grabber = RestFrameGrabber(renderer.uri)
+            self.assertEqual(frame_grabber.get_frame(), DEFAULT_FRAME)
+            self.assertIsNone(frame_grabber.get_frame())
+            self.assertEqual(renderer.server.requests, 2)
+        finally:
+            renderer.stop()
+
+    def test_connections_are_kept_alive(self):
+        first_grabber = RestFrameGrabber(self.renderer.uri)
+        second_grabber = RestFrameGrabber(self.renderer.uri)
+        for _ in range(3):
+            self.assertEqual(first_grabber.get_frame(), DEFAULT_FRAME)
+            self.assertEqual(second_grabber.get_frame(), DEFAULT_FRAME)
+        self.assertEqual(self.renderer.server.requests, 6)
+        self.assertEqual(self.renderer.server.connections, 1)
+
+    def test_failing_renderer_is_not_hammered(self):
+        renderer = FakeRenderer(FailingRendererHandler)
+        try:
+            frame_grabber = RestFrameGrabber(renderer.uri)
+            for _ in range(settings.HISS_CIRCUIT_FAILURE_THRESHOLD):
+                self.assertIsNone(frame_grabber.get_frame())
+            # The circuit is shared by all the grabbers of the rendering resource
+            self.assertRaises(CircuitOpenError, RestFrameGrabber(renderer.uri).get_frame)
+            self.assertEqual(renderer.server.requests, settings.HISS_CIRCUIT_FAILURE_THRESHOLD)
+        finally:
+            renderer.stop()
+
+    def test_idle_sessions_are_closed(self):
+        frame_grabber = RestFrameGrabber(self.renderer.uri)
+        self.assertEqual(frame_grabber.get_frame(), DEFAULT_FRAME)
+        session = get_session(self.renderer.uri)
+        rest_frame_grabber.HISS_UPSTREAM_IDLE_TIMEOUT = 0
+        rest_frame_grabber._next_expiry[0] = 0
+        try:
+            self.assertIsNot(get_session(self.renderer.uri), session)
+        finally:
+            rest_frame_grabber.HISS_UPSTREAM_IDLE_TIMEOUT = settings.HISS_UPSTREAM_IDLE_TIMEOUT
+        # The grabber uses a new connection of the new session
+        self.assertEqual(frame_grabber.get_frame(), DEFAULT_FRAME)
+        self.assertEqual(self.renderer.server.connections, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
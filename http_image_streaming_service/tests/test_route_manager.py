@@ -22,6 +22,7 @@
 # All rights reserved. Do not distribute without further notice.
 
 from http_image_streaming_service.service.http_image_streaming_service import application
+from http_image_streaming_service.service.route_manager import RouteManager
 import http_image_streaming_service.service.settings \
     as settings
 
@@ -159,5 +160,159 @@ class FlaskTestCase(unittest.TestCase):
                                  headers=headers)
         self.assertEqual(response.status_code, 200)
 
+    def test_bulk_routes(self):
+        tester = application.test_client(self)
+        routes = [{'session_id': 'bulk' + str(index), 'uri': 'http://test' + str(index) + '.com'}
+                  for index in range(3)]
+        routes.append({'session_id': 'bulk3', 'uri': 'http://test3.com', 'fps': -1})
+        routes.append({'uri': 'http://test4.com'})
+        routes.append({'session_id': 'bulk5', 'uri': 5})
+        routes.append({'session_id': ['bulk6'], 'uri': 'http://test6.com'})
+        response = tester.post(BASE_URL + 'routes', content_type='application/json',
+                               data=json.dumps(routes))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in json.loads(response.data)],
+                         [201, 201, 201, 400, 400, 400, 400])
+        response = tester.get(BASE_URL + 'route', headers={'Cookie': 'HBP=bulk1;'})
+        self.assertEqual(response.status_code, 200)
+
+        response = tester.delete(BASE_URL + 'routes', content_type='application/json',
+                                 data=json.dumps(['bulk0', 'bulk1', 'bulk2', 'bulk3', 7]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in json.loads(response.data)],
+                         [200, 200, 200, 404, 400])
+        response = tester.get(BASE_URL + 'route', headers={'Cookie': 'HBP=bulk1;'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_paginated_routes(self):
+        tester = application.test_client(self)
+        routes = [{'session_id': 'page' + str(index), 'uri': 'http://test' + str(index) + '.com'}
+                  for index in range(5)]
+        routes.append({'session_id': 'other', 'uri': 'http://other.com'})
+        tester.post(BASE_URL + 'routes', content_type='application/json',
+                    data=json.dumps(routes))
+        try:
+            response = tester.get(BASE_URL + 'routes?prefix=page&limit=2')
+            self.assertEqual(json.loads(response.data),
+                             [['page0', 'http://test0.com'], ['page1', 'http://test1.com']])
+            link = response.headers['Link']
+            self.assertTrue(link.endswith('>; rel="next"'))
+            next_url = link[link.index('?'):link.index('>')]
+            response = tester.get(BASE_URL + 'routes' + next_url)
+            self.assertEqual([route[0] for route in json.loads(response.data)],
+                             ['page2', 'page3'])
+
+            response = tester.get(BASE_URL + 'routes?prefix=page&after=page3&format=ndjson')
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            self.assertEqual([json.loads(line) for line in response.data.splitlines()],
+                             [['page4', 'http://test4.com']])
+            self.assertNotIn('Link', response.headers)
+
+            response = tester.get(BASE_URL + 'routes?limit=0')
+            self.assertEqual(response.status_code, 400)
+        finally:
+            tester.delete(BASE_URL + 'routes', content_type='application/json',
+                          data=json.dumps([route['session_id'] for route in routes]))
+
+    def test_paginated_unicode_routes(self):
+        tester = application.test_client(self)
+        session_ids = [u'\xe9t\xe91', u'\xe9t\xe92', u'\U0001f600a', u'\U0001f600b']
+        tester.post(BASE_URL + 'routes', content_type='application/json',
+                    data=json.dumps([{'session_id': session_id, 'uri': 'http://test.com'}
+                                     for session_id in session_ids]))
+        try:
+            response = tester.get(BASE_URL + 'routes?limit=1&prefix=%C3%A9')
+            self.assertEqual(response.status_code, 200)
+            link = response.headers['Link']
+            self.assertIn('after=%C3%A9t%C3%A91', link)
+            response = tester.get(BASE_URL + 'routes' + link[link.index('?'):link.index('>')])
+            self.assertEqual([route[0] for route in json.loads(response.data)],
+                             [session_ids[1]])
+
+            # The last character of the prefix cannot be incremented
+            response = tester.get(BASE_URL + 'routes?prefix=%F0%9F%98%80')
+            self.assertEqual([route[0] for route in json.loads(response.data)],
+                             session_ids[2:])
+        finally:
+            response = tester.delete(BASE_URL + 'routes', content_type='application/json',
+                                     data=json.dumps(session_ids))
+            self.assertEqual(response.status_code, 200)
+
+    def test_bulk_routes_require_array(self):
+        tester = application.test_client(self)
+        response = tester.post(BASE_URL + 'routes', content_type='application/json',
+                               data=json.dumps({'session_id': 'bulk0'}))
+        self.assertEqual(response.status_code, 400)
+
+
+class RouteCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._ttl = settings.HISS_ROUTE_CACHE_TTL
+
+    def tearDown(self):
+        settings.HISS_ROUTE_CACHE_TTL = self._ttl
+
+    def test_cache_invalidated_by_local_changes(self):
+        route_manager = RouteManager()
+        with application.app_context():
+            route_manager.create_route(DEFAULT_SESSION_ID, DEFAULT_ROUTE)
+            self.assertEqual(route_manager.get_route_target(DEFAULT_SESSION_ID), DEFAULT_ROUTE)
+            route_manager.delete_route(DEFAULT_SESSION_ID)
+        self.assertRaises(KeyError, route_manager.get_route, DEFAULT_SESSION_ID)
+
+    def test_route_fps(self):
+        route_manager = RouteManager()
+        with application.app_context():
+            self.assertFalse(route_manager.has_route(DEFAULT_SESSION_ID))
+            route_manager.create_route(DEFAULT_SESSION_ID, DEFAULT_ROUTE)
+            self.assertTrue(route_manager.has_route(DEFAULT_SESSION_ID))
+            self.assertEqual(route_manager.get_route_fps(DEFAULT_SESSION_ID),
+                             settings.HISS_FRAMES_PER_SECOND)
+            route_manager.create_route(DEFAULT_SESSION_ID, DEFAULT_ROUTE, 25)
+            self.assertEqual(route_manager.get_route_fps(DEFAULT_SESSION_ID), 25)
+            route_manager.delete_route(DEFAULT_SESSION_ID)
+
+        # Infinite frame rates would remove the pacing of the session
+        tester = application.test_client(self)
+        response = tester.post(BASE_URL + 'route', content_type='application/json',
+                               headers={'Cookie': 'HBP=' + DEFAULT_SESSION_ID + ';'},
+                               data='{"uri": "' + DEFAULT_ROUTE + '", "fps": 1e400}')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cache_invalidated_by_other_processes(self):
+        settings.HISS_ROUTE_CACHE_TTL = 3600
+        route_manager = RouteManager()
+        other_route_manager = RouteManager()
+        self.assertRaises(KeyError, route_manager.get_route, DEFAULT_SESSION_ID)
+        with application.app_context():
+            other_route_manager.create_route(DEFAULT_SESSION_ID, DEFAULT_ROUTE)
+            # Changes made by another process are ignored until the cache expires
+            self.assertRaises(KeyError, route_manager.get_route, DEFAULT_SESSION_ID)
+            settings.HISS_ROUTE_CACHE_TTL = 0
+            self.assertEqual(route_manager.get_route_target(DEFAULT_SESSION_ID), DEFAULT_ROUTE)
+            other_route_manager.delete_route(DEFAULT_SESSION_ID)
+        self.assertRaises(KeyError, route_manager.get_route, DEFAULT_SESSION_ID)
+
+    def test_route_health(self):
+        route_manager = RouteManager()
+        with application.app_context():
+            route_manager.create_route(DEFAULT_SESSION_ID, DEFAULT_ROUTE)
+            self.assertEqual(route_manager.record_route_health(
+                DEFAULT_SESSION_ID, DEFAULT_ROUTE, False, 0.5), 1)
+            self.assertEqual(route_manager.record_route_health(
+                DEFAULT_SESSION_ID, DEFAULT_ROUTE, False, 0.5), 2)
+            # Probes of a replaced route are ignored
+            self.assertEqual(route_manager.record_route_health(
+                DEFAULT_SESSION_ID, 'http://other', True, 0.1), 0)
+            routes = json.loads(route_manager.list_routes(health=True))
+            route = [route for route in routes if route[0] == DEFAULT_SESSION_ID][0]
+            self.assertEqual(route[1], DEFAULT_ROUTE)
+            self.assertEqual(route[2]['health'], 'unhealthy')
+            self.assertEqual(route[2]['failures'], 2)
+            self.assertEqual(route_manager.record_route_health(
+                DEFAULT_SESSION_ID, DEFAULT_ROUTE, True, 0.1), 0)
+            route_manager.delete_route(DEFAULT_SESSION_ID)
+
 if __name__ == '__main__':
     unittest.main()
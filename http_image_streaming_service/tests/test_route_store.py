@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.route_store import RouteStore, SCHEMA_VERSION
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+
+class RouteStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._folder = tempfile.mkdtemp()
+        self._db_path = os.path.join(self._folder, 'hiss.db')
+
+    def tearDown(self):
+        shutil.rmtree(self._folder)
+
+    def test_create_schema(self):
+        store = RouteStore(self._db_path)
+        self.assertEqual(store.query('pragma user_version')[0][0], SCHEMA_VERSION)
+        self.assertEqual(store.query('pragma journal_mode')[0][0], 'wal')
+        with store.transaction() as cur:
+            cur.execute('insert or replace into routes (session_id, uri) values(?, ?)',
+                        ('1', 'http://test1.com'))
+            cur.execute('insert or replace into routes (session_id, uri) values(?, ?)',
+                        ('1', 'http://test2.com'))
+        self.assertEqual(store.query('select session_id, uri from routes'),
+                         [('1', 'http://test2.com')])
+        store.close()
+
+    def test_migrate_legacy_database(self):
+        conn = sqlite3.connect(self._db_path)
+        conn.execute('create table routes (session_id text, uri text)')
+        conn.executemany('insert into routes (session_id, uri) values(?, ?)',
+                         [('1', 'http://test1.com'),
+                          ('2', 'http://test2.com'),
+                          ('1', 'http://test3.com')])
+        conn.commit()
+        conn.close()
+
+        store = RouteStore(self._db_path)
+        self.assertEqual(sorted(store.query('select session_id, uri from routes')),
+                         [('1', 'http://test3.com'), ('2', 'http://test2.com')])
+        self.assertEqual(store.query('select version from routes_version'), [(1,)])
+
+        # Migrating an up-to-date database leaves it untouched
+        RouteStore(self._db_path).migrate()
+        self.assertEqual(store.query('select version from routes_version'), [(1,)])
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.route_supervisor import RouteSupervisor
+from http_image_streaming_service.tests.test_rest_frame_grabber import FakeRenderer
+from flask import Flask
+
+import socket
+import unittest
+
+
+def unused_uri():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    uri = 'http://127.0.0.1:' + str(sock.getsockname()[1])
+    sock.close()
+    return uri
+
+
+class FakeRouteManager(object):
+
+    def __init__(self, routes):
+        self.routes = dict(routes)
+        self.checked = dict()
+        self.failures = dict()
+        self.health = dict()
+
+    def list_route_targets(self):
+        return [(session_id, uri, self.checked.get(session_id))
+                for session_id, uri in self.routes.items()]
+
+    def record_route_health(self, session_id, uri, healthy, latency):
+        self.health[session_id] = healthy
+        self.failures[session_id] = 0 if healthy else self.failures.get(session_id, 0) + 1
+        return self.failures[session_id]
+
+    def delete_route(self, session_id):
+        del self.routes[session_id]
+
+
+class RouteSupervisorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.renderer = FakeRenderer()
+
+    def tearDown(self):
+        self.renderer.stop()
+
+    def test_dead_routes_are_removed(self):
+        route_manager = FakeRouteManager({'alive': self.renderer.uri,
+                                          'dead': unused_uri()})
+        supervisor = RouteSupervisor(route_manager, Flask(__name__), interval=10,
+                                     timeout=1, max_failures=2)
+        supervisor.check_routes()
+        self.assertEqual(route_manager.health, {'alive': True, 'dead': False})
+        self.assertEqual(sorted(route_manager.routes), ['alive', 'dead'])
+        supervisor.check_routes()
+        self.assertEqual(sorted(route_manager.routes), ['alive'])
+
+    def test_recently_probed_routes_are_skipped(self):
+        route_manager = FakeRouteManager({'alive': self.renderer.uri})
+        route_manager.checked['alive'] = float('inf')
+        supervisor = RouteSupervisor(route_manager, Flask(__name__), interval=10)
+        supervisor.check_routes()
+        self.assertEqual(route_manager.health, {})
+
+if __name__ == '__main__':
+    unittest.main()
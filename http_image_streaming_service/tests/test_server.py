@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service import server
+import http_image_streaming_service.service.settings \
+    as settings
+
+import unittest
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = settings.HISS_SERVER
+
+    def tearDown(self):
+        settings.HISS_SERVER = self.server
+
+    def test_unpatched_gevent_server(self):
+        try:
+            from gevent import monkey
+        except ImportError:
+            self.skipTest('gevent is not installed')
+        if monkey.is_module_patched('threading'):
+            self.skipTest('threading is already patched')
+        settings.HISS_SERVER = server.GEVENT_SERVER
+        self.assertRaises(RuntimeError, server.run, None, 'localhost', 0)
+
+    def test_unknown_server(self):
+        settings.HISS_SERVER = 'unknown'
+        self.assertRaises(ValueError, server.run, None, 'localhost', 0)
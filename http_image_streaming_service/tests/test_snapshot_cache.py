@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.http_image_streaming_service import application
+from http_image_streaming_service.service.snapshot_cache import SnapshotCache
+from http_image_streaming_service.tests.test_rest_frame_grabber import DEFAULT_FRAME, \
+    FakeRenderer
+import http_image_streaming_service.service.settings \
+    as settings
+
+import json
+import unittest
+
+DEFAULT_SESSION_ID = 'snapshotsession'
+BASE_URL = settings.APPLICATION_NAME + '/' + settings.API_VERSION + '/'
+
+
+class FakeBroadcasters(object):
+
+    def __init__(self):
+        self.frame = None
+
+    def latest_frame(self, session_id):
+        return self.frame
+
+
+class FakeFrameGrabber(object):
+
+    calls = 0
+
+    def get_frame(self):
+        FakeFrameGrabber.calls += 1
+        return b'fetched' + str(FakeFrameGrabber.calls).encode()
+
+
+class SnapshotCacheTestCase(unittest.TestCase):
+
+    def test_frames_are_fetched_once(self):
+        broadcasters = FakeBroadcasters()
+        cache = SnapshotCache(broadcasters, ttl=3600)
+        FakeFrameGrabber.calls = 0
+        self.assertEqual(cache.get(DEFAULT_SESSION_ID, FakeFrameGrabber), b'fetched1')
+        self.assertEqual(cache.get(DEFAULT_SESSION_ID, FakeFrameGrabber), b'fetched1')
+        self.assertEqual(FakeFrameGrabber.calls, 1)
+
+        # Frames of streamed or pushed sessions are never fetched
+        broadcasters.frame = b'streamed'
+        self.assertEqual(cache.get(DEFAULT_SESSION_ID, FakeFrameGrabber), b'streamed')
+        self.assertEqual(FakeFrameGrabber.calls, 1)
+
+    def test_expired_frames_are_fetched_again(self):
+        cache = SnapshotCache(FakeBroadcasters(), ttl=0)
+        FakeFrameGrabber.calls = 0
+        self.assertEqual(cache.get(DEFAULT_SESSION_ID, FakeFrameGrabber), b'fetched1')
+        self.assertEqual(cache.get(DEFAULT_SESSION_ID, FakeFrameGrabber), b'fetched2')
+
+
+class SnapshotEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.renderer = FakeRenderer()
+        self.tester = application.test_client(self)
+        self.headers = {'Cookie': 'HBP=' + DEFAULT_SESSION_ID + ';'}
+        response = self.tester.post(BASE_URL + 'route', content_type='application/json',
+                                    headers=self.headers,
+                                    data=json.dumps({'uri': self.renderer.uri}))
+        self.assertEqual(response.status_code, 201)
+
+    def tearDown(self):
+        self.tester.delete(BASE_URL + 'route', headers=self.headers)
+        self.renderer.stop()
+
+    def test_snapshot(self):
+        response = self.tester.get(BASE_URL + 'snapshot/' + DEFAULT_SESSION_ID)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, DEFAULT_FRAME)
+        self.assertEqual(response.mimetype, 'image/jpeg')
+        self.assertTrue(response.headers['Cache-Control'].startswith('max-age='))
+        etag = response.headers['ETag']
+
+        response = self.tester.get(BASE_URL + 'snapshot/' + DEFAULT_SESSION_ID,
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.renderer.server.requests, 1)
+
+    def test_snapshot_without_route(self):
+        response = self.tester.get(BASE_URL + 'snapshot/unknown')
+        self.assertEqual(response.status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
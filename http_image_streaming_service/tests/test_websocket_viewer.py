@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2014-2017, Human Brain Project
+#                          Cyrille Favreau <cyrille.favreau@epfl.ch>
+#
+# This file is part of RenderingResourceManager
+# <https://github.com/BlueBrain/HTTPImageStreaming>
+#
+# This library is free software; you can redistribute it and/or modify it under
+# the terms of the GNU Lesser General Public License version 3.0 as published
+# by the Free Software Foundation.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU Lesser General Public License for more
+# details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this library; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+# All rights reserved. Do not distribute without further notice.
+
+from http_image_streaming_service.service.frame_transcoder import FrameTier, NATIVE_TIER
+from http_image_streaming_service.service.http_image_streaming_service import application, \
+    admission, broadcasters, route_manager, websocket_streamer
+from http_image_streaming_service.service.websocket_viewer import FRAME_HEADER, \
+    ViewerControl, pack_frame
+import http_image_streaming_service.service.settings \
+    as settings
+
+import threading
+import time
+import unittest
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+BASE_URL = settings.APPLICATION_NAME + '/' + settings.API_VERSION + '/'
+DEFAULT_SESSION_ID = 'websocketsession'
+
+
+class FakeWebSocket(object):
+
+    def __init__(self):
+        self.closed = False
+        self.messages = list()
+        self._received = Queue()
+        self._condition = threading.Condition()
+
+    def send(self, message, binary=False):
+        with self._condition:
+            self.messages.append((message, binary))
+            self._condition.notify_all()
+
+    def receive(self):
+        return self._received.get()
+
+    def put(self, message):
+        self._received.put(message)
+
+    def close(self):
+        self.closed = True
+        self._received.put(None)
+
+    def wait_for_messages(self, count, timeout=1):
+        deadline = time.time() + timeout
+        with self._condition:
+            while len(self.messages) < count and time.time() < deadline:
+                self._condition.wait(deadline - time.time())
+            return len(self.messages)
+
+    def sequences(self):
+        with self._condition:
+            return [FRAME_HEADER.unpack(message[:FRAME_HEADER.size])[0]
+                    for message, _ in self.messages]
+
+
+class FakeFrameGrabber(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def get_frame(self):
+        self.calls += 1
+        return b'frame' + str(self.calls).encode()
+
+
+class ViewerControlTestCase(unittest.TestCase):
+
+    def test_pack_frame(self):
+        message = pack_frame(42, b'frame')
+        sequence, _ = FRAME_HEADER.unpack(message[:FRAME_HEADER.size])
+        self.assertEqual(sequence, 42)
+        self.assertEqual(message[FRAME_HEADER.size:], b'frame')
+
+    def test_settings(self):
+        control = ViewerControl(NATIVE_TIER)
+        self.assertIsNone(control.fps)
+        control.handle_message('{"fps": 10}')
+        self.assertEqual(control.fps, 10)
+        control.handle_message('{"width": 320, "quality": 50}')
+        self.assertEqual(control.tier, FrameTier(320, None, 50))
+        self.assertRaises(ValueError, control.handle_message, '{"fps": 0}')
+        self.assertRaises(ValueError, control.handle_message, '{"fps": 1e400}')
+        self.assertRaises(ValueError, control.handle_message, '{"width": 0}')
+        self.assertRaises(ValueError, control.handle_message, '{"ack": [1]}')
+        self.assertRaises(ValueError, control.handle_message, 'fps')
+        self.assertRaises(ValueError, control.handle_message, '[]')
+
+    def test_flow_control(self):
+        control = ViewerControl(NATIVE_TIER, window=2)
+        for sequence in range(1, 5):
+            # Frames are not throttled until the viewer acknowledges them
+            self.assertTrue(control.wait_for_window(0))
+            control.sent(sequence)
+        control.handle_message('{"ack": 3}')
+        self.assertTrue(control.wait_for_window(0))
+        control.sent(5)
+        self.assertFalse(control.wait_for_window(0))
+        control.handle_message('{"ack": 5}')
+        self.assertTrue(control.wait_for_window(0))
+
+
+class StreamingSocketTestCase(unittest.TestCase):
+
+    def test_websocket_required(self):
+        tester = application.test_client(self)
+        response = tester.get(BASE_URL + 'image_streaming_socket/testsession')
+        self.assertEqual(response.status_code, 400)
+
+
+class WebSocketStreamerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        route_manager.create_routes([(DEFAULT_SESSION_ID, 'http://localhost:3000', 100)])
+        self.websocket = FakeWebSocket()
+        self.ticket = admission.admit(DEFAULT_SESSION_ID, '127.0.0.1')
+        self.streamer = threading.Thread(
+            target=websocket_streamer,
+            args=(self.websocket, DEFAULT_SESSION_ID, FakeFrameGrabber()),
+            kwargs={'ticket': self.ticket})
+        self.streamer.daemon = True
+        self.streamer.start()
+
+    def tearDown(self):
+        self.websocket.close()
+        self.streamer.join(2)
+        route_manager.delete_routes([DEFAULT_SESSION_ID])
+
+    def test_frames_are_sent(self):
+        self.assertEqual(self.websocket.wait_for_messages(3), 3)
+        message, binary = self.websocket.messages[0]
+        self.assertTrue(binary)
+        sequence, _ = FRAME_HEADER.unpack(message[:FRAME_HEADER.size])
+        self.assertTrue(sequence > 0)
+        self.assertTrue(message[FRAME_HEADER.size:].startswith(b'frame'))
+        self.assertEqual(self.websocket.sequences(), sorted(self.websocket.sequences()))
+
+    def test_stream_is_throttled_by_acknowledgements(self):
+        self.websocket.wait_for_messages(1)
+        self.websocket.put('{"ack": 0}')
+        # The streamer stops once the frames sent exceed the window
+        time.sleep(0.3)
+        count = len(self.websocket.messages)
+        time.sleep(0.3)
+        self.assertEqual(len(self.websocket.messages), count)
+        self.websocket.put('{"ack": ' + str(self.websocket.sequences()[-1]) + '}')
+        self.assertTrue(self.websocket.wait_for_messages(count + 1) > count)
+
+    def test_closed_websocket_ends_stream(self):
+        self.websocket.wait_for_messages(1)
+        self.websocket.close()
+        self.streamer.join(2)
+        self.assertFalse(self.streamer.is_alive())
+        self.assertTrue(self.ticket.released)
+        self.assertIsNone(broadcasters.get(DEFAULT_SESSION_ID))
+
+if __name__ == '__main__':
+    unittest.main()